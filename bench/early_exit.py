@@ -0,0 +1,111 @@
+"""Early-exit routing on a labelled mix of requests, with simulated models.
+
+Run from the repo root: python -m bench.early_exit [--requests 2000] [--full-ms 40] [--small-ms 10]
+
+The full model and the small model are stand-ins that sleep (--full-ms, --small-ms) and answer from the
+labels: the full model calls `multiply` exactly when the request needs it. Every request also goes
+through the full model alone as the baseline. The bench reports, per route, how many requests took it,
+their mean latency and the share routed correctly (a tool request must not reach `small_llm`, and
+`direct_tool` must produce the same call as the full model)."""
+
+import argparse
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from common import metrics
+from common.early_exit import EarlyExitRouter
+
+TOOL = [
+    ("Multiply {a} and {b}.", True),
+    ("{a} times {b}", True),
+    ("What is {a} * {b}?", True),
+    ("what's the product of {a} and {b}", True),
+    ("Can you multiply {a} by {b} and tell me the result?", True),
+    ("I bought {a} boxes of {b} apples, how many apples is that?", True),
+    ("Hey, can you multiply {a} by {b}?", True),
+    ("Hello, what is {a} times {b}?", True),
+    ("OK now multiply {a} by {b}", True),
+]
+NO_TOOL = [
+    ("Thanks!", False),
+    ("Hello there", False),
+    ("Who wrote the novel Dune?", False),
+    ("Tell me a joke about cats.", False),
+    ("What is the capital of Portugal?", False),
+    ("Explain what a tool call is.", False),
+    ("Summarize the plot of Hamlet in one sentence.", False),
+]
+
+
+def multiply(a: int, b: int) -> int:
+    return a * b
+
+
+def sample(rng: random.Random):
+    template, needs_tool = rng.choice(TOOL + NO_TOOL)
+    a, b = rng.randrange(1, 1000), rng.randrange(1, 1000)
+    return template.format(a=a, b=b), needs_tool, {"name": "multiply", "args": {"a": a, "b": b}}
+
+
+def main(args):
+    rng = random.Random(0)
+    labels = {}
+
+    def full_model(messages):
+        time.sleep(args.full_ms / 1000)
+        needs_tool, call = labels[messages[-1].content]
+        return AIMessage(content="" if needs_tool else "ok", tool_calls=[{**call, "id": "call_0"}] if needs_tool else [])
+
+    def small_model(state):
+        time.sleep(args.small_ms / 1000)
+        return {"messages": [AIMessage(content="ok")]}
+
+    router = EarlyExitRouter(tools=[multiply], min_examples=args.min_examples)
+    nodes = {
+        "direct_tool": router.direct_tool,
+        "small_llm": router.observe("small_llm", small_model),
+        "tool_calling_llm": router.observe("tool_calling_llm", lambda state: {"messages": [full_model(state["messages"])]}),
+    }
+
+    latencies, correct = defaultdict(list), defaultdict(int)
+    baseline = []
+    for _ in range(args.requests):
+        text, needs_tool, call = sample(rng)
+        labels[text] = (needs_tool, call)
+        state = {"messages": [HumanMessage(content=text)]}
+
+        start = time.perf_counter()
+        full_model(state["messages"])
+        baseline.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        route = router.route(state)
+        update = nodes[route](state)
+        latencies[route].append(time.perf_counter() - start)
+        calls = [{"name": c["name"], "args": c["args"]} for c in update["messages"][-1].tool_calls]
+        correct[route] += calls == ([call] if needs_tool else []) if route != "tool_calling_llm" else 1
+
+    routed = [t for times in latencies.values() for t in times]
+    print(f"{'route':<17} {'requests':>8} {'mean ms':>8} {'correct':>8}")
+    for route in ("direct_tool", "small_llm", "tool_calling_llm"):
+        times = latencies.get(route, [])
+        if times:
+            print(f"{route:<17} {len(times):>8} {statistics.mean(times) * 1000:>8.1f} {correct[route] / len(times):>8.1%}")
+    print(
+        f"mean latency: {statistics.mean(routed) * 1000:.1f}ms routed vs {statistics.mean(baseline) * 1000:.1f}ms"
+        f" with the full model only ({statistics.mean(baseline) / statistics.mean(routed):.1f}x)"
+    )
+    print(metrics.snapshot("router."))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Early-exit routing vs the full model only")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--full-ms", type=float, default=40)
+    parser.add_argument("--small-ms", type=float, default=10)
+    parser.add_argument("--min-examples", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""Benchmark fan-in strategies for 2 to 1,000 parallel branches.
+
+Run from the repo root: python -m bench.fanout_reducers
+
+Every branch returns a list of `ITEMS` values. The merge strategies:
+
+- operator.add: left fold, what `Annotated[list, add]` does with one update per branch
+- reduce_list: the None-safe custom reducer from mod2/state_reducers.py, also a left fold
+- tree_reduce(add): pairwise merge of the branch results
+- ExtendList: the channel, which gets every branch update of the step at once
+
+It also times running sleep-bound branches on the thread pool and as coroutines."""
+
+import asyncio
+import time
+from functools import reduce
+from operator import add
+
+from common.fanout import ExtendList, arun_branches, run_branches, tree_reduce
+
+ITEMS = 50
+
+
+def reduce_list(left: list | None, right: list | None) -> list:
+    if not left:
+        left = []
+    if not right:
+        right = []
+    return left + right
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+print(f"merge cost in ms ({ITEMS} items per branch)")
+print(f"{'branches':>9} {'operator.add':>13} {'reduce_list':>12} {'tree_reduce':>12} {'ExtendList':>12}")
+for width in (2, 10, 50, 100, 250, 500, 1000):
+    parts = [list(range(ITEMS)) for _ in range(width)]
+    fold_add = timed(lambda: reduce(add, parts, []))
+    fold_custom = timed(lambda: reduce(reduce_list, parts, None))
+    tree = timed(lambda: tree_reduce(add, parts))
+    extend = timed(lambda: ExtendList().update(parts))
+    print(f"{width:>9} {fold_add:>13.3f} {fold_custom:>12.3f} {tree:>12.3f} {extend:>12.3f}")
+
+
+def io_branch(x):
+    time.sleep(0.01)
+    return [x]
+
+
+async def aio_branch(x):
+    await asyncio.sleep(0.01)
+    return [x]
+
+
+print("\nbranch execution in ms (each branch waits 10ms on I/O)")
+print(f"{'branches':>9} {'sequential':>11} {'threads':>9} {'asyncio':>9}")
+for width in (2, 10, 100, 1000):
+    inputs = list(range(width))
+    sequential = timed(lambda: [io_branch(x) for x in inputs], repeat=1) if width <= 100 else float("nan")
+    threads = timed(lambda: run_branches(io_branch, inputs, max_workers=64), repeat=1)
+    coroutines = timed(lambda: asyncio.run(arun_branches(aio_branch, inputs)), repeat=1)
+    print(f"{width:>9} {sequential:>11.1f} {threads:>9.1f} {coroutines:>9.1f}")
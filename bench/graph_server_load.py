@@ -0,0 +1,105 @@
+"""Load test of the multi-tenant graph server, with a fake model.
+
+Run from the repo root: python -m bench.graph_server_load [--tenants 8] [--threads 16] [--turns 3] [--url URL]
+
+The OpenAI endpoint is a local fake (common/fake_http.py, 50ms per call), so the numbers measure the
+server and the graphs, not the model. Without --url the ASGI app runs in this process (httpx's ASGI
+transport); with --url it targets a running server (which must then point OPENAI_BASE_URL at a fake too).
+
+Every tenant runs its threads concurrently, turn after turn, on both graphs. The test reports
+throughput, latency percentiles and 429s, then checks that a tenant cannot see another tenant's thread."""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from common.fake_http import FakeServer, chat_completions_handler
+
+
+async def turn(client, tenant: str, graph: str, thread: str, text: str, latencies: list, statuses: dict):
+    start = time.perf_counter()
+    response = await client.post(
+        f"/graphs/{graph}/threads/{thread}/invoke",
+        json={"messages": [{"role": "user", "content": text}]},
+        headers={"X-Tenant": tenant},
+    )
+    latencies.append(time.perf_counter() - start)
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def tenant_load(client, tenant: str, threads: int, turns: int, latencies: list, statuses: dict):
+    for n in range(turns):
+        await asyncio.gather(
+            *(
+                turn(client, tenant, graph, f"t{i}", f"Add {i} and {n}.", latencies, statuses)
+                for i in range(threads)
+                for graph in ("react", "summary")
+            )
+        )
+
+
+async def main(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        from common.graph_server import GraphServer
+
+        app = GraphServer(max_concurrency_per_tenant=args.per_tenant)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://graph-server", timeout=120)
+
+    async with client:
+        graphs = (await client.get("/graphs")).json()["graphs"]
+        print(f"graphs: {graphs}")
+
+        latencies, statuses = [], {}
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(tenant_load(client, f"tenant{t}", args.threads, args.turns, latencies, statuses) for t in range(args.tenants))
+        )
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(
+            f"{len(latencies)} requests in {elapsed:.1f}s: {len(latencies) / elapsed:.1f} req/s,"
+            f" p50 {statistics.median(latencies) * 1000:.0f}ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms,"
+            f" statuses {statuses}"
+        )
+
+        # Same thread id, two tenants: each one only sees its own messages
+        mine = (await client.get("/graphs/react/threads/t0/state", headers={"X-Tenant": "tenant0"})).json()
+        other = (await client.get("/graphs/react/threads/t0/state", headers={"X-Tenant": "intruder"})).json()
+        assert mine.get("messages"), "tenant0 lost its thread"
+        assert not other.get("messages"), "a tenant could read another tenant's thread"
+        print(f"isolation: tenant0 sees {len(mine['messages'])} messages in t0, another tenant sees none")
+
+        response = await client.post(
+            "/graphs/react/threads/streamed/stream",
+            json={"messages": [{"role": "user", "content": "Add 1 and 2."}]},
+            headers={"X-Tenant": "tenant0"},
+        )
+        events = [line for line in response.text.splitlines() if line.startswith("data:")]
+        print(f"stream: {len(events)} events")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of common.graph_server with a fake model")
+    parser.add_argument("--tenants", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--per-tenant", type=int, default=8)
+    parser.add_argument("--url")
+    args = parser.parse_args()
+
+    with FakeServer(chat_completions_handler, latency=0.05) as fake_model, tempfile.TemporaryDirectory() as tmp:
+        os.environ["OPENAI_BASE_URL"] = f"{fake_model.url}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+        os.environ["MEMORY_STORE_PATH"] = os.path.join(tmp, "long_term_memory")
+        # The fake model has no rate limit: don't let the scheduler pace it like the real API
+        os.environ.setdefault("LLM_RPM", "1000000")
+        os.environ.setdefault("LLM_TPM", "1000000000")
+        os.environ.setdefault("LLM_MAX_CONCURRENCY", "256")
+        asyncio.run(main(args))
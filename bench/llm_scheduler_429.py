@@ -0,0 +1,44 @@
+"""Drive the shared LLM scheduler against a local fake OpenAI endpoint that answers 429.
+
+Run from the repo root: python -m bench.llm_scheduler_429
+
+60 threads call the model at once: 40 interactive turns and 20 background
+summarization calls. A third of the requests are rejected with 429 and a
+Retry-After header. Every call should still succeed. The scheduler backs off,
+shrinks its concurrency limit, and serves interactive calls first."""
+
+import threading
+import time
+
+from langchain_core.messages import HumanMessage
+
+from common import metrics
+from common.fake_http import FakeServer, chat_completions_handler
+from common.llm_scheduler import BACKGROUND, INTERACTIVE, get_llm, get_scheduler
+
+with FakeServer(chat_completions_handler, latency=0.05, error_rate=0.33, error_status=429, retry_after=0.1, seed=7) as server:
+    interactive = get_llm("gpt-4o", INTERACTIVE, base_url=f"{server.url}/v1", api_key="fake")
+    background = get_llm("gpt-4o", BACKGROUND, base_url=f"{server.url}/v1", api_key="fake")
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    failures = []
+
+    def call(llm, priority):
+        start = time.perf_counter()
+        try:
+            llm.invoke([HumanMessage(content="Hello!")])
+            latencies[priority].append(time.perf_counter() - start)
+        except Exception as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=call, args=(background, BACKGROUND)) for _ in range(20)]
+    threads += [threading.Thread(target=call, args=(interactive, INTERACTIVE)) for _ in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for priority, name in ((INTERACTIVE, "interactive"), (BACKGROUND, "background")):
+        values = sorted(latencies[priority])
+        print(f"{name:<12} ok={len(values):<3} p50={values[len(values) // 2]:.2f}s p95={values[int(len(values) * 0.95)]:.2f}s")
+    print(f"failed={len(failures)} upstream requests={server.calls} concurrency limit now={get_scheduler().limit}")
+    print(metrics.snapshot("llm."))
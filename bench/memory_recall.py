@@ -0,0 +1,108 @@
+"""Recall latency of the long-term memory store, from 10k to 1M memories.
+
+Run from the repo root: python -m bench.memory_recall [--nprobe 8 16 32]
+
+Fills a VectorMemoryStore (in a temporary directory) with unit vectors, builds the IVF index, and times
+`search` against exact search over the same vectors. Recall@3 is the share of exact top-3 results the
+index also returns. Each query is a stored fact plus noise of norm 0.3 (a paraphrase).
+
+Two datasets:
+
+- clustered: facts grouped around 1000 topics, as real embeddings are
+- uniform: random directions, the worst case for any IVF index (no structure to exploit)
+
+Then the per-user case: 100k facts from other users and 5 for one user, searched in that user's namespace
+(exact, since the namespace is small) with the default HashingEmbedder."""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from common.memory_store import VectorMemoryStore
+
+DIM = 64
+QUERIES = 200
+
+
+class LookupEmbedder:
+    """Queries are vectors we already know, so the bench measures search only."""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def __call__(self, text):
+        return self.vectors[text]
+
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def dataset(kind: str, n: int, rng):
+    if kind == "uniform":
+        return unit(rng.standard_normal((n, DIM)))
+    topics = unit(rng.standard_normal((1000, DIM)))
+    return unit(topics[rng.integers(0, len(topics), n)] + 0.6 / np.sqrt(DIM) * rng.standard_normal((n, DIM)))
+
+
+def bench_ivf(nprobes):
+    rng = np.random.default_rng(0)
+    print(f"{'dataset':>9} {'memories':>9} {'nprobe':>6} {'ivf search':>11} {'exact search':>13} {'recall@3':>9}")
+    for kind in ("clustered", "uniform"):
+        for n in (10_000, 100_000, 1_000_000):
+            with tempfile.TemporaryDirectory() as tmp:
+                embedder = LookupEmbedder()
+                store = VectorMemoryStore(f"{tmp}/memories", embedder=embedder, dim=DIM, n_lists=int(np.sqrt(n)), train_after=n + 1)
+                vectors = dataset(kind, n, rng)
+                for start in range(0, n, 100_000):
+                    chunk = vectors[start : start + 100_000]
+                    store.add_batch([f"fact {i}" for i in range(start, start + len(chunk))], vectors=chunk)
+                store.build_index()
+
+                queries = unit(vectors[rng.choice(n, QUERIES)] + 0.3 / np.sqrt(DIM) * rng.standard_normal((QUERIES, DIM)))
+                for i, q in enumerate(queries):
+                    embedder.vectors[f"q{i}"] = q
+
+                start = time.perf_counter()
+                exact = [{f"fact {i}" for i in np.argpartition(-(vectors @ q), 3)[:3]} for q in queries]
+                exact_ms = (time.perf_counter() - start) / QUERIES * 1000
+
+                for nprobe in nprobes:
+                    store.nprobe = nprobe
+                    start = time.perf_counter()
+                    approx = [{m["text"] for m in store.search(f"q{i}", k=3)} for i in range(QUERIES)]
+                    ivf_ms = (time.perf_counter() - start) / QUERIES * 1000
+                    recall = np.mean([len(a & e) / 3 for a, e in zip(approx, exact)])
+                    print(f"{kind:>9} {n:>9} {nprobe:>6} {ivf_ms:>9.3f}ms {exact_ms:>11.3f}ms {recall:>9.2f}")
+
+
+def bench_namespace():
+    rng = np.random.default_rng(1)
+    words = "the a of city team project meeting coffee report train music book car garden weather phone".split()
+    user = ["I live in Berlin", "My dog is called Rex", "I work as a nurse", "I prefer tea over coffee", "My sister is Anna"]
+    questions = {"which city do I live in": "I live in Berlin", "what is my dog called": "My dog is called Rex"}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorMemoryStore(f"{tmp}/memories", train_after=50_000)
+        others = [" ".join(rng.choice(words, 6)) for _ in range(100_000)]
+        vectors = np.stack([store.embedder(t) for t in others[:1000]])
+        for start in range(0, len(others), 1000):
+            # 100 other users; reuse embeddings, the bench is about the index
+            store.add_batch(others[start : start + 1000], namespace=f"user{start // 1000}", vectors=vectors)
+        for fact in user:
+            store.add(fact, namespace="me")
+        start = time.perf_counter()
+        answers = {q: [m["text"] for m in store.search(q, k=3, namespace="me")] for q in questions}
+        ms = (time.perf_counter() - start) / len(questions) * 1000
+    for q, expected in questions.items():
+        assert expected in answers[q], f"{q!r} -> {answers[q]}"
+    print(f"per-user search among {len(others) + len(user)} facts: {ms:.3f}ms, {len(questions)}/{len(questions)} facts recalled")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall and latency of VectorMemoryStore")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    args = parser.parse_args()
+    bench_ivf(args.nprobe)
+    bench_namespace()
@@ -0,0 +1,114 @@
+"""Replay a corpus of recorded traces and report latency and CPU, against a saved baseline.
+
+Run from the repo root: python -m bench.replay [--speed 0] [--runs 3] [--baseline before.json] [--save after.json]
+
+Traces live in `traces/<target>/*.jsonl.gz`, where the target is one of TARGETS. Record one with e.g.
+
+    GRAPH_TRACE_MODE=record GRAPH_TRACE_FILE=traces/router/multiply.jsonl.gz python -m mod1.router
+
+(end a mod2.message_summ session with "exit", so the input is part of the trace).
+
+Every trace is replayed in a fresh process (GRAPH_TRACE_MODE=replay): the LLM and tool responses are the
+recorded ones. The wall and CPU times compared are measured in the process, around the graph runs only
+(`get_trace().timed()`, reported through GRAPH_TRACE_REPORT), so interpreter start-up and imports don't
+drown the orchestration cost; the whole process wall time is shown alongside for context.
+With --speed 0 the recorded latencies are skipped; with --speed 1 they are kept, which shows the effect
+of overlapping calls.
+Save the results before a change and compare after it:
+
+    python -m bench.replay --save before.json
+    (change the code)
+    python -m bench.replay --baseline before.json"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TARGETS = {
+    "react_graph": "mod1.agent",
+    "router": "mod1.router",
+    "summarizer": "mod2.message_summ",
+}
+
+
+def replay(module: str, trace: str, speed: float) -> dict:
+    """Replay one trace; the in-process timings of its graph runs, plus the whole process wall time."""
+    with tempfile.TemporaryDirectory() as tmp:
+        report = os.path.join(tmp, "report.json")
+        env = {
+            **os.environ,
+            "GRAPH_TRACE_MODE": "replay",
+            "GRAPH_TRACE_FILE": trace,
+            "GRAPH_TRACE_SPEED": str(speed),
+            "GRAPH_TRACE_REPORT": report,
+        }
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, "-m", module], env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        process = time.perf_counter() - start
+        if done.returncode:
+            raise RuntimeError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else f"exit code {done.returncode}")
+        if not os.path.exists(report):
+            raise RuntimeError("no timing report (does the target time its graph runs?)")
+        with open(report) as f:
+            runs = json.load(f)
+    if not runs["runs"]:
+        raise RuntimeError("no timed graph runs")
+    return {"runs": runs["runs"], "wall": runs["wall_seconds"], "cpu": runs["cpu_seconds"], "process": process}
+
+
+def delta(now: float, before: float | None) -> str:
+    if not before:
+        return ""
+    return f"{(now - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", nargs="?", default="traces")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--speed", type=float, default=0.0)
+    parser.add_argument("--baseline")
+    parser.add_argument("--save")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'trace':<40} {'runs':>4} {'wall':>9} {'Δwall':>8} {'cpu':>9} {'Δcpu':>8} {'process':>9}")
+    for target, module in TARGETS.items():
+        for trace in sorted(glob.glob(os.path.join(args.traces, target, "*.jsonl*"))):
+            name = os.path.relpath(trace, args.traces)
+            try:
+                runs = [replay(module, trace, args.speed) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{name:<40} FAILED: {e}")
+                continue
+            # Median of the runs, so one noisy run doesn't decide
+            result = {key: statistics.median(run[key] for run in runs) for key in ("wall", "cpu", "process")}
+            results[name] = {"graph_runs": runs[0]["runs"], **result}
+            before = baseline.get(name, {})
+            if "graph_runs" not in before:
+                before = {}  # a baseline from before in-process timing: not comparable
+            print(
+                f"{name:<40} {runs[0]['runs']:>4} {result['wall'] * 1000:>7.1f}ms {delta(result['wall'], before.get('wall')):>8}"
+                f" {result['cpu'] * 1000:>7.1f}ms {delta(result['cpu'], before.get('cpu')):>8} {result['process'] * 1000:>7.0f}ms"
+            )
+    if not results:
+        print(f"No traces found under {args.traces}/<{'|'.join(TARGETS)}>/")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Summarization latency against history length: one big call vs hierarchical.
+
+Run from the repo root: python -m bench.summary_scaling
+
+Uses a fake model whose latency grows with the size of its prompt
+(20ms + 2ms per message), so no API key is needed; its summaries depend on the
+prompt, so different chunks and merges never share a cache entry. For every history
+length it times the turn after two new messages were added, the way conv_summary
+runs in mod2/message_summ.py, with the LLM calls it made and how many of them ran
+one after the other (rounds: the changed chunk, then one merge per level above it)."""
+
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from common import metrics
+from common.chunk_summary import HierarchicalSummarizer
+
+
+class SlowFakeModel:
+    def invoke(self, messages):
+        time.sleep(0.02 + 0.002 * len(messages) + 0.00005 * sum(len(m.content) for m in messages))
+        digest = hashlib.sha256("\0".join(m.content for m in messages).encode()).hexdigest()[:12]
+        return AIMessage(content=f"summary {digest} of {len(messages)} messages")
+
+    def batch(self, inputs, config=None):
+        workers = (config or {}).get("max_concurrency", 8)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.invoke, inputs))
+
+
+def history(n):
+    return [
+        (HumanMessage if i % 2 == 0 else AIMessage)(content=f"message {i} " * 10, id=str(i))
+        for i in range(n)
+    ]
+
+
+model = SlowFakeModel()
+print(f"{'messages':>9} {'single call':>12} {'hierarchical':>13} {'llm calls':>10} {'rounds':>7}")
+for n in (12, 48, 192, 768):
+    messages = history(n)
+    start = time.perf_counter()
+    model.invoke(messages + [HumanMessage(content="Create a summary of the conversation above:")])
+    single = time.perf_counter() - start
+
+    summarizer = HierarchicalSummarizer(model, chunk_size=6, fan_in=4)
+    summarizer.summarize(messages[:-2])  # earlier turns filled the cache
+    metrics.reset("summary.")
+    start = time.perf_counter()
+    summarizer.summarize(messages)
+    hierarchical = time.perf_counter() - start
+    counts = metrics.snapshot("summary.")
+    calls, rounds = counts.get("summary.llm_calls", 0), counts.get("summary.llm_rounds", 0)
+    print(f"{n:>9} {single * 1000:>10.0f}ms {hierarchical * 1000:>11.0f}ms {calls:>10} {rounds:>7}")
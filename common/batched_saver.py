@@ -0,0 +1,253 @@
+"""Checkpoint writes buffered in memory and flushed to the real checkpointer in the background.
+
+A checkpointer writes after every super-step (`assistant`, `tools`, `assistant`...). With a checkpointer
+that serializes and hits a disk or a database, each step waits for that write before the next one runs.
+`BatchingSaver` wraps any checkpointer:
+
+- `put` / `put_writes` only queue the write and return; a background thread applies the queue
+  to the wrapped checkpointer in order, taking everything that piled up during the previous batch
+- reads (`get_tuple`, `list`, `get_state`...) flush the thread they read first, so they always see its writes
+- `invoke(graph, ...)` runs the graph and flushes before returning: the final checkpoint of each
+  invoke is durable once it returns
+
+Every write gets a sequence number, and a flush only waits for the writes made before it. A flush of one
+thread (every read, `invoke`) also moves that thread's writes to the front of the queue: writes stay in
+order within a thread, which is all a thread's checkpoints depend on, so readers never wait behind other
+threads' writes, however many of them keep coming.
+
+    saver = BatchingSaver(IndexedMemorySaver())
+    graph = builder.compile(checkpointer=saver)
+    output = saver.invoke(graph, inputs, config)
+
+Crash recovery: the writes of a thread are applied in the order they were made, so the wrapped checkpointer
+always holds a prefix of each thread's run. If the process dies mid-run, the steps after the last flush are lost and
+the thread resumes from its last durable checkpoint: the end of the previous `saver.invoke`, or an
+intermediate step that had already been flushed. Pending writes are flushed with (after) their
+checkpoint, so a durable checkpoint never references writes that are missing. `graph.invoke` without
+the wrapper gives no durability guarantee until the next read or `flush()`.
+
+LangGraph 0.6 defers checkpoint writes by default (`durability="async"`: each checkpoint is written while the
+next step runs, and invoke returns once the last one is saved). Against that default this wrapper is no faster
+(bench/checkpoint_batching.py: 0.92-1.02x), so prefer the stock checkpointer there; the wrapper is for
+versions without `durability`, or checkpointers whose writes are much slower than a step."""
+
+import asyncio
+import atexit
+import threading
+import time
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from common import metrics
+
+
+class BatchingSaver(BaseCheckpointSaver):
+    """Buffer checkpoint writes and flush them to `inner` asynchronously, in batches.
+
+    Args:
+        inner: the checkpointer that makes writes durable
+        max_batch: most writes applied per batch
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver, max_batch: int = 256):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+        self.max_batch = max_batch
+        self._queue = []  # (sequence number, thread id, method name, args), in write order
+        self._batch = []  # writes taken by the flusher and not applied yet
+        self._enqueued = 0  # sequence number of the last write queued
+        self._last_write = {}  # thread id -> sequence number of its last write not applied yet
+        self._applied = {}  # thread id -> sequence number of its last write applied (while it has pending ones)
+        self._waiting = {}  # thread id -> flushes waiting for it
+        self._error = None
+        self._closed = False
+        self._stopped = False  # the flusher is gone: nothing more will be applied
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._flusher, name="checkpoint-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def config_specs(self):
+        return self.inner.config_specs
+
+    # Background flush
+
+    def _flusher(self):
+        try:
+            self._flush_loop()
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+
+    def _take_batch(self) -> list:
+        # Writes of threads someone is waiting for go first (keeping their order), then the oldest ones
+        if self._waiting:
+            urgent = [w for w in self._queue if w[1] in self._waiting]
+            if urgent:
+                rest = [w for w in self._queue if w[1] not in self._waiting]
+                self._queue = urgent + rest
+                metrics.incr("checkpoint.prioritized", len(urgent))
+        # Never wait for more: what piled up while the last batch was applied is the next batch
+        batch, self._queue = self._queue[: self.max_batch], self._queue[self.max_batch :]
+        return batch
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                self._batch = self._take_batch()
+                batch = list(self._batch)
+            start = time.perf_counter()
+            for seq, thread_id, method, args in batch:
+                try:
+                    getattr(self.inner, method)(*args)
+                except Exception as e:
+                    # Applying later writes would leave a gap in the thread: stop, and fail the next call
+                    with self._cond:
+                        self._error = e
+                        metrics.incr("checkpoint.dropped", len(self._queue) + len(self._batch))
+                        self._queue, self._batch, self._closed = [], [], True
+                    return
+                with self._cond:
+                    self._batch.pop(0)
+                    if self._last_write.get(thread_id) == seq:
+                        del self._last_write[thread_id]
+                        self._applied.pop(thread_id, None)
+                    else:
+                        self._applied[thread_id] = seq
+                    self._cond.notify_all()
+            metrics.incr("checkpoint.batches")
+            metrics.incr("checkpoint.flushed", len(batch))
+            metrics.incr("checkpoint.flush_seconds", time.perf_counter() - start)
+
+    def _enqueue(self, method: str, args: tuple) -> None:
+        thread_id = args[0]["configurable"]["thread_id"]
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise RuntimeError("BatchingSaver is closed.")
+            self._enqueued += 1
+            self._queue.append((self._enqueued, thread_id, method, args))
+            self._last_write[thread_id] = self._enqueued
+            metrics.incr("checkpoint.buffered")
+            self._cond.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("A buffered checkpoint write failed.") from error
+
+    def _flushed(self, thread_id: str | None, target: int) -> bool:
+        """Whether every write up to `target` (of `thread_id`, or of all threads) is applied."""
+        if thread_id is not None:
+            return thread_id not in self._last_write or self._applied.get(thread_id, 0) >= target
+        # Prioritized writes move ahead, so the oldest pending write can be anywhere
+        return min((w[0] for w in self._batch + self._queue), default=target + 1) > target
+
+    def flush(self, thread_id: str | None = None, timeout: float | None = None) -> None:
+        """Block until the writes made so far (to `thread_id`, or to any thread) are applied to the wrapped checkpointer.
+
+        Writes made while waiting are not waited for.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued if thread_id is None else self._last_write.get(thread_id, 0)
+            if thread_id is not None:
+                self._waiting[thread_id] = self._waiting.get(thread_id, 0) + 1
+            try:
+                while not self._flushed(thread_id, target) and not self._stopped:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Checkpoint flush timed out.")
+                    self._cond.wait(timeout=remaining)
+            finally:
+                if thread_id is not None:
+                    self._waiting[thread_id] -= 1
+                    if not self._waiting[thread_id]:
+                        del self._waiting[thread_id]
+            self._raise_error()
+
+    def close(self, flush: bool = True) -> None:
+        """Stop the flusher; with `flush=False` the buffered writes are dropped (as in a crash)."""
+        with self._cond:
+            if self._closed:
+                return
+            if not flush:
+                metrics.incr("checkpoint.dropped", len(self._queue))
+                self._queue = []
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def invoke(self, graph, input, config=None, **kwargs):
+        """`graph.invoke(...)`, returning only once its final checkpoint is durable."""
+        output = graph.invoke(input, config, **kwargs)
+        self.flush(_thread_id(config))
+        return output
+
+    async def ainvoke(self, graph, input, config=None, **kwargs):
+        output = await graph.ainvoke(input, config, **kwargs)
+        await asyncio.to_thread(self.flush, _thread_id(config))
+        return output
+
+    # Writes: buffered
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self._enqueue("put", (config, checkpoint, metadata, new_versions))
+        # What the wrapped checkpointer will return once the write is applied
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self._enqueue("put_writes", (config, list(writes), task_id, task_path))
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        self.put_writes(config, writes, task_id, task_path)
+
+    # Reads: flush first
+
+    def get_tuple(self, config):
+        self.flush(_thread_id(config))
+        return self.inner.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        self.flush(_thread_id(config))
+        return self.inner.list(config, filter=filter, before=before, limit=limit)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush(thread_id)
+        self.inner.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        await asyncio.to_thread(self.flush, _thread_id(config))
+        return await self.inner.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        await asyncio.to_thread(self.flush, _thread_id(config))
+        async for item in self.inner.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.flush, thread_id)
+        await self.inner.adelete_thread(thread_id)
+
+    def get_next_version(self, current, channel):
+        return self.inner.get_next_version(current, channel)
+
+
+def _thread_id(config) -> str | None:
+    """Thread a read is about, or None (all threads)."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
@@ -0,0 +1,215 @@
+"""Per-request budgets for the assistant <-> tools loop.
+
+In a ReAct graph the `tools -> assistant` edge forms a loop that only the recursion limit stops.
+`StepBudget` bounds each request (one user turn) on:
+
+- LLM hops
+- tool calls
+- tokens (from the model's usage metadata)
+- wall-clock time
+
+Identical tool calls within a turn are answered from a memo instead of running again.
+One AI message asking for more tool calls than the turn has left runs only that many; the rest are
+answered "Not run". When the budget is spent, the run ends with a short final answer instead of an error.
+
+    budget = StepBudget(max_llm_calls=6, max_tool_calls=10)
+
+    builder = StateGraph(BudgetState)
+    builder.add_node("assistant", budget.assistant(assistant))
+    builder.add_node("tools", budget.tools(ToolNode(tools)))
+    builder.add_node("budget_exhausted", budget.exhausted)
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", budget.route)
+    builder.add_conditional_edges("tools", budget.after_tools)
+    builder.add_edge("budget_exhausted", END)
+"""
+
+import functools
+import json
+import time
+from dataclasses import dataclass
+from typing import Literal
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, MessagesState
+
+from common import metrics
+
+
+class BudgetState(MessagesState):
+    llm_calls: int  # LLM hops in the current turn
+    tool_calls: int  # tools actually executed in the current turn
+    tool_calls_skipped: int  # tool calls not run in the current turn, the tool_calls budget being spent
+    tokens: int  # tokens used in the current turn
+    turn_started: float  # wall-clock start of the current turn
+    tool_memo: dict  # "name:args" -> tool output, for the current turn
+
+
+def memo_key(tool_call: dict) -> str:
+    return f"{tool_call['name']}:{json.dumps(tool_call['args'], sort_keys=True, default=str)}"
+
+
+@dataclass
+class StepBudget:
+    max_llm_calls: int = 8
+    max_tool_calls: int = 16
+    max_tokens: int = 20_000
+    max_seconds: float = 60.0
+
+    def exceeded(self, state) -> str | None:
+        """Name of the first limit the turn has reached, or None."""
+        if state.get("llm_calls", 0) >= self.max_llm_calls:
+            return "llm_calls"
+        if state.get("tool_calls", 0) >= self.max_tool_calls:
+            return "tool_calls"
+        if state.get("tokens", 0) >= self.max_tokens:
+            return "tokens"
+        started = state.get("turn_started")
+        if started and time.time() - started >= self.max_seconds:
+            return "seconds"
+        return None
+
+    @staticmethod
+    def _turn_counters(state) -> dict:
+        if isinstance(state["messages"][-1], HumanMessage):
+            # A new user turn: start a fresh budget (counters persist with a checkpointer)
+            return {"llm_calls": 0, "tool_calls": 0, "tool_calls_skipped": 0, "tokens": 0, "turn_started": time.time(), "tool_memo": {}}
+        return {
+            "llm_calls": state.get("llm_calls", 0),
+            "tool_calls": state.get("tool_calls", 0),
+            "tool_calls_skipped": state.get("tool_calls_skipped", 0),
+            "tokens": state.get("tokens", 0),
+            "turn_started": state.get("turn_started"),
+            "tool_memo": state.get("tool_memo") or {},
+        }
+
+    def should_start(self, state):
+        """Predicate for `SpeculativeExecutor.stream`, for the assistant hop about to run on `state`.
+
+        A call may start early only if the tools node would run it: it is not in the memo,
+        the hop will not end the turn, and the turn has tool calls left (each start uses one).
+        """
+        counters = self._turn_counters(state)
+        after_hop = {**counters, "llm_calls": counters["llm_calls"] + 1}
+        remaining = self.max_tool_calls - counters["tool_calls"]
+
+        def allow(call) -> bool:
+            nonlocal remaining
+            if memo_key(call) in counters["tool_memo"] or remaining <= 0 or self.exceeded(after_hop):
+                return False
+            remaining -= 1
+            return True
+
+        return allow
+
+    def assistant(self, node):
+        """Wrap the assistant node so it counts LLM hops and tokens per turn."""
+
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            counters = self._turn_counters(state)
+            if isinstance(state["messages"][-1], HumanMessage):
+                metrics.incr("budget.turns")
+            update = node(state, *args, **kwargs)
+            counters["llm_calls"] += 1
+            for m in update.get("messages", []):
+                usage = getattr(m, "usage_metadata", None) or {}
+                counters["tokens"] += usage.get("total_tokens", 0)
+            metrics.incr("budget.llm_calls")
+            return {**update, **counters}
+
+        return wrapper
+
+    def tools(self, tool_node):
+        """Wrap the tools node so repeated identical calls are answered from the memo,
+        and calls past `max_tool_calls` are answered without running."""
+
+        def wrapper(state):
+            ai_message = state["messages"][-1]
+            memo = dict(state.get("tool_memo") or {})
+            results, to_run, answered = {}, [], []
+            for call in ai_message.tool_calls:
+                key = memo_key(call)
+                if key in memo:
+                    metrics.incr("budget.memo_hits")
+                    results[call["id"]] = ToolMessage(
+                        content=memo[key], name=call["name"], tool_call_id=call["id"]
+                    )
+                    answered.append(call)
+                else:
+                    to_run.append(call)
+
+            # One message may ask for more calls than the turn has left: run those that fit
+            remaining = max(self.max_tool_calls - state.get("tool_calls", 0), 0)
+            to_run, skipped = to_run[:remaining], to_run[remaining:]
+            for call in skipped:
+                results[call["id"]] = ToolMessage(
+                    content="Not run: the tool_calls budget for this request is spent.",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                )
+            if skipped:
+                metrics.incr("budget.tool_calls_skipped", len(skipped))
+
+            # A node that started calls early (SpeculativeExecutor) drops the ones it won't be asked for
+            discard = getattr(tool_node, "discard", None)
+            if discard is not None and (answered or skipped):
+                discard(answered + skipped)
+
+            if to_run:
+                output = tool_node.invoke(
+                    {"messages": [AIMessage(content="", tool_calls=to_run)]}
+                )
+                by_id = {call["id"]: call for call in to_run}
+                for m in output["messages"]:
+                    results[m.tool_call_id] = m
+                    if getattr(m, "status", "success") != "error":
+                        memo[memo_key(by_id[m.tool_call_id])] = m.content
+                metrics.incr("budget.tool_calls", len(to_run))
+
+            return {
+                # Keep the order of the tool calls
+                "messages": [results[c["id"]] for c in ai_message.tool_calls if c["id"] in results],
+                "tool_calls": state.get("tool_calls", 0) + len(to_run),
+                "tool_calls_skipped": state.get("tool_calls_skipped", 0) + len(skipped),
+                "tool_memo": memo,
+            }
+
+        return wrapper
+
+    def route(self, state) -> Literal["tools", "budget_exhausted", "__end__"]:
+        """Like `tools_condition`, but ends the run gracefully once the budget is spent."""
+        last = state["messages"][-1]
+        if not getattr(last, "tool_calls", None):
+            return END
+        if self.exceeded(state):
+            return "budget_exhausted"
+        return "tools"
+
+    def after_tools(self, state) -> Literal["assistant", "budget_exhausted"]:
+        """Edge after the tools node: back to the assistant, unless calls were skipped for the budget."""
+        if state.get("tool_calls_skipped"):
+            return "budget_exhausted"
+        return "assistant"
+
+    def exhausted(self, state):
+        """Answer the pending tool calls (if any) and close the turn with a short final message."""
+        reason = self.exceeded(state) or "unknown"
+        metrics.incr(f"budget.exhausted.{reason}")
+        pending = getattr(state["messages"][-1], "tool_calls", None) or []
+        # Every tool call needs a tool message, or the next turn would be rejected by the API
+        skipped = [
+            ToolMessage(
+                content=f"Not run: the {reason} budget for this request is spent.",
+                name=call["name"],
+                tool_call_id=call["id"],
+            )
+            for call in pending
+        ]
+        final = AIMessage(
+            content=(
+                "I had to stop before finishing: this request reached its "
+                f"{reason.replace('_', ' ')} budget."
+            )
+        )
+        return {"messages": skipped + [final]}
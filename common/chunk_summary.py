@@ -0,0 +1,143 @@
+"""Hierarchical (map-reduce) summarization of long conversations.
+
+Summarizing the whole history in one LLM call gets slower every turn and eventually overflows the context window.
+`HierarchicalSummarizer` instead:
+
+1. splits the messages into fixed-size chunks (aligned from the start, so old chunks never change)
+2. summarizes the chunks in parallel (`model.batch`)
+3. merges the partial summaries `fan_in` at a time, level by level, until one is left
+
+Chunk and merge results are cached by content hash, so a new turn only summarizes
+the chunk that changed and the O(log n) merges above it: one chunk call, then one merge call per level,
+each waiting for the one below (`summary.llm_rounds` counts these sequential batches).
+The cache is locked, so one summarizer can serve concurrent graph runs."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import HumanMessage
+
+from common import metrics
+
+CHUNK_PROMPT = "Create a summary of the conversation above:"
+MERGE_PROMPT = (
+    "These are summaries of consecutive parts of one conversation. "
+    "Combine them into a single summary of the whole conversation:"
+)
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def message_key(message) -> str:
+    return f"{message.type}:{message.content}"
+
+
+class HierarchicalSummarizer:
+    """Summarize a message list with parallel chunk summaries and a tree of merges.
+
+    Args:
+        model: chat model used for both chunk summaries and merges
+        chunk_size: number of messages per chunk
+        fan_in: number of partial summaries merged by one call
+        max_concurrency: LLM calls running at the same time
+        cache_size: number of chunk / merge summaries kept
+    """
+
+    def __init__(self, model, chunk_size: int = 6, fan_in: int = 4, max_concurrency: int = 8, cache_size: int = 1024):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.fan_in = fan_in
+        self.max_concurrency = max_concurrency
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.incr("summary.cache_hits")
+                return self._cache[key]
+        return None
+
+    def _store(self, key, summary):
+        with self._lock:
+            self._cache[key] = summary
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self, keyed_prompts: list) -> list[str]:
+        """Answer `[(cache key, prompt messages)]`, calling the model in parallel for the cache misses."""
+        results = [self._cached(key) for key, _ in keyed_prompts]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            metrics.incr("summary.llm_calls", len(missing))
+            metrics.incr("summary.llm_rounds")
+            responses = self.model.batch(
+                [keyed_prompts[i][1] for i in missing],
+                config={"max_concurrency": self.max_concurrency},
+            )
+            for i, response in zip(missing, responses):
+                results[i] = response.content
+                self._store(keyed_prompts[i][0], response.content)
+        return results
+
+    def missing_chunks(self, messages) -> int:
+        """Number of chunk summaries `summarize(messages)` would have to ask the model for."""
+        keys = ["chunk:" + _digest(*map(message_key, messages[i : i + self.chunk_size])) for i in range(0, len(messages), self.chunk_size)]
+        with self._lock:
+            return sum(key not in self._cache for key in keys)
+
+    def summarize(self, messages, prior_summary: str = "") -> str:
+        """Summary of `messages`, optionally continuing `prior_summary` (for messages no longer in the list)."""
+        chunks = [
+            messages[i : i + self.chunk_size]
+            for i in range(0, len(messages), self.chunk_size)
+        ]
+        partials = self._run(
+            [
+                (
+                    "chunk:" + _digest(*map(message_key, chunk)),
+                    list(chunk) + [HumanMessage(content=CHUNK_PROMPT)],
+                )
+                for chunk in chunks
+            ]
+        )
+        if prior_summary:
+            partials = [prior_summary] + partials
+
+        # Merge level by level; every level is one parallel batch
+        while len(partials) > 1:
+            groups = [
+                partials[i : i + self.fan_in]
+                for i in range(0, len(partials), self.fan_in)
+            ]
+            merged = self._run(
+                [
+                    (
+                        "merge:" + _digest(*group),
+                        [
+                            HumanMessage(
+                                content=MERGE_PROMPT
+                                + "".join(
+                                    f"\n\nPart {n}: {text}"
+                                    for n, text in enumerate(group, 1)
+                                )
+                            )
+                        ],
+                    )
+                    for group in groups
+                    if len(group) > 1
+                ]
+            )
+            # A lone trailing partial goes up a level unchanged
+            it = iter(merged)
+            partials = [next(it) if len(group) > 1 else group[0] for group in groups]
+        return partials[0] if partials else ""
@@ -0,0 +1,175 @@
+"""Adaptive context window: one node that decides, every turn, how much history the model sees.
+
+`mod2/filtering_trim.py` (filter, last message only, `trim_messages`) and `mod2/message_summ.py` (running summary)
+each apply one fixed strategy, so a graph pays the same price whether the conversation is 2 messages or 200.
+`ContextWindow` picks per turn, from most to least context kept:
+
+- `full`: the whole history, when it fits the token budget (free)
+- `summary`: a summary of the older messages plus the most recent ones (LLM calls for new chunks only, see `HierarchicalSummarizer`)
+- `trim`: the most recent messages that fit the budget (free)
+- `last`: only the last message (free)
+
+The first strategy that fits the token budget (and, for `summary`, the latency SLO) wins: short conversations
+pay nothing, and a summary is only made when its estimated latency is affordable.
+The order is by context kept, not by cost: `trim` nearly always fits, but it drops the older turns outright,
+so an affordable summary is preferred to it. `latency_slo=0` only allows summaries already cached (free);
+without a summarizer only the free strategies are tried. Whether a summary will fit is estimated
+(from the size of the previous summaries) before the model is called, so a summary that would not fit
+costs nothing.
+Token counts are cached per message, so each turn only counts the new ones.
+The chosen strategy and the tokens saved are written to the state and to `common.metrics` (`context.*`).
+
+    context = ContextWindow(max_tokens=2000, summarizer=HierarchicalSummarizer(summary_model), latency_slo=1.0)
+
+    builder = StateGraph(ContextState)
+    builder.add_node("context", context.node)
+    builder.add_node("chat_model", lambda state: {"messages": [llm.invoke(state["context"])]})
+    builder.add_edge(START, "context")
+    builder.add_edge("context", "chat_model")
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import SystemMessage
+from langgraph.graph import MessagesState
+
+from common import metrics
+
+
+class ContextState(MessagesState):
+    context: list  # messages the model sees this turn (replaced every turn)
+    summary: str  # summary of the messages left out of the context
+    context_strategy: str  # strategy chosen for this turn
+    tokens_saved: int  # tokens left out of the context this turn
+
+
+def approx_tokens(message) -> int:
+    # About 4 characters per token, plus a few for the role and separators
+    return len(str(message.content)) // 4 + 4
+
+
+class ContextWindow:
+    """Pick the context of each turn to fit a token budget and a latency SLO.
+
+    Args:
+        max_tokens: token budget of the context
+        summarizer: a `HierarchicalSummarizer`; without one, the `summary` strategy is skipped
+        latency_slo: seconds the summary may add to a turn (None: no limit)
+        recent_share: share of the budget kept for recent messages when summarizing
+        token_counter: `message -> tokens` (e.g. `lambda m: llm.get_num_tokens_from_messages([m])`)
+        cache_size: number of per-message token counts kept
+        call_latency: initial guess of one summarizer call, in seconds (then measured)
+        summary_tokens: initial guess of the tokens of a summary (then measured)
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        summarizer=None,
+        latency_slo: float | None = None,
+        recent_share: float = 0.6,
+        token_counter=approx_tokens,
+        cache_size: int = 10_000,
+        call_latency: float = 2.0,
+        summary_tokens: int = 300,
+    ):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.latency_slo = latency_slo
+        self.recent_share = recent_share
+        self.token_counter = token_counter
+        self.cache_size = cache_size
+        self.call_latency = call_latency
+        self.summary_tokens = summary_tokens
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, message) -> int:
+        """Tokens of one message, cached by message id (or content)."""
+        key = message.id or hashlib.sha256(f"{message.type}:{message.content}".encode()).hexdigest()
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        tokens = self.token_counter(message)
+        with self._lock:
+            self._counts[key] = tokens
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def _recent_start(self, messages, counts, budget: int) -> int:
+        """Index of the first of the most recent messages that fit `budget` (the last one always counts)."""
+        start, used = len(messages) - 1, counts[-1]
+        while start > 0 and used + counts[start - 1] <= budget:
+            start -= 1
+            used += counts[start]
+        # A tool result without the tool call before it is rejected by the API: keep the call too
+        while start > 0 and messages[start].type == "tool":
+            start -= 1
+        return start
+
+    def _summary_latency(self, old) -> float:
+        missing = self.summarizer.missing_chunks(old)
+        if not missing:
+            return 0.0
+        # Chunks are summarized in one parallel batch, then merged level by level
+        chunks = math.ceil(len(old) / self.summarizer.chunk_size)
+        return self.call_latency * (1 + math.ceil(math.log(max(chunks, 1), self.summarizer.fan_in)))
+
+    def select(self, messages) -> tuple[str, list, str]:
+        """`(strategy, context messages, summary)` for this turn."""
+        counts = [self.count(m) for m in messages]
+        if sum(counts) <= self.max_tokens:
+            return "full", list(messages), ""
+
+        if self.summarizer is not None:
+            start = self._recent_start(messages, counts, int(self.max_tokens * self.recent_share))
+            old = messages[:start]
+            room = self.max_tokens - sum(counts[start:])
+            estimate = self._summary_latency(old) if old else None
+            if estimate is not None and self.summary_tokens > room:
+                # The summary would most likely not fit next to the recent messages: don't pay for it
+                metrics.incr("context.summary_too_big")
+            elif estimate is not None and self.latency_slo is not None and estimate > self.latency_slo:
+                metrics.incr("context.summary_over_slo")
+            elif estimate is not None:
+                began = time.perf_counter()
+                summary = self.summarizer.summarize(old)
+                elapsed = time.perf_counter() - began
+                if estimate:
+                    # Learn the cost of one call from what this summary actually took
+                    calls = estimate / self.call_latency
+                    self.call_latency = 0.8 * self.call_latency + 0.2 * elapsed / calls
+                metrics.incr("context.summary_seconds", elapsed)
+                note = SystemMessage(content=f"Summary of conversation earlier: {summary}")
+                self.summary_tokens = round(0.8 * self.summary_tokens + 0.2 * self.count(note))
+                if self.count(note) <= room:
+                    return "summary", [note] + list(messages[start:]), summary
+                metrics.incr("context.summary_too_big")
+
+        start = self._recent_start(messages, counts, self.max_tokens)
+        if sum(counts[start:]) > self.max_tokens:
+            # Even the last message (with its tool call) is over budget: send it anyway
+            metrics.incr("context.over_budget")
+        return ("trim" if start < len(messages) - 1 else "last"), list(messages[start:]), ""
+
+    def node(self, state) -> dict:
+        """Graph node: writes the context, strategy and tokens saved of this turn."""
+        messages = state["messages"]
+        strategy, context, summary = self.select(messages)
+        total = sum(self.count(m) for m in messages)
+        sent = sum(self.count(m) for m in context)
+        metrics.incr(f"context.strategy.{strategy}")
+        metrics.incr("context.tokens_sent", sent)
+        metrics.incr("context.tokens_saved", max(0, total - sent))
+        return {
+            "context": context,
+            "summary": summary or state.get("summary", ""),
+            "context_strategy": strategy,
+            "tokens_saved": max(0, total - sent),
+        }
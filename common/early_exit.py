@@ -0,0 +1,225 @@
+"""Early-exit routing: skip the full tool-calling model when the request is obvious.
+
+In the router graph every input goes through `tool_calling_llm`, even "Multiply 4 and 5." (the answer is
+one `multiply` call) or "Thanks!" (no tool at all). `EarlyExitRouter` runs a cheap local stage first:
+
+1. rules: whole-message patterns that map straight to a tool call (`direct_tool`)
+   or are nothing but small talk (`small_llm`: a cheaper model without tools);
+   a request that names a tool ("multiply", "times"...) otherwise always goes to the full model
+2. a small local model (naive Bayes over words) that learns, from the full model's own decisions,
+   which requests never need a tool; it only routes to `small_llm` when it is confident
+3. everything else goes to the full model (`tool_calling_llm`), unchanged
+
+Decisions are cached by normalized text. Per route it counts calls and seconds (`router.<route>.*`),
+and accuracy: a sample of early exits (`audit_rate`) is also sent to the full model in the background
+and compared (`router.<route>.agree` / `disagree`), and on the full route the local model's guess is
+compared with what the full model did.
+
+    early_exit = EarlyExitRouter(tools=[multiply], audit=llm_with_tools.invoke, audit_rate=0.05)
+    builder.add_node("direct_tool", early_exit.direct_tool)
+    builder.add_node("small_llm", early_exit.observe("small_llm", small_llm_node))
+    builder.add_node("tool_calling_llm", early_exit.observe("tool_calling_llm", tool_calling_llm))
+    builder.add_conditional_edges(START, early_exit.route)
+    builder.add_edge("direct_tool", "tools")
+"""
+
+import functools
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from common import metrics
+from common.tool_select import tokenize
+
+_NUMBER = r"(-?\d+)"
+
+# Whole-message patterns: (regex, tool name, names of the captured arguments)
+RULES = [
+    (re.compile(rf"^(?:please\s+)?multiply\s+{_NUMBER}\s+(?:and|by|with)\s+{_NUMBER}\s*[.!?]?$", re.I), "multiply", ("a", "b")),
+    (re.compile(rf"^(?:what(?:'s|\s+is)\s+)?{_NUMBER}\s*(?:\*|x|times)\s*{_NUMBER}\s*[.!?]?$", re.I), "multiply", ("a", "b")),
+    (re.compile(rf"^(?:what(?:'s|\s+is)\s+)?the\s+product\s+of\s+{_NUMBER}\s+and\s+{_NUMBER}\s*[.!?]?$", re.I), "multiply", ("a", "b")),
+]
+
+# The whole message is small talk: greetings and thanks, punctuation only
+_GREETING = r"(?:hi|hello|hey|thanks|thank\s+you|thx|ok(?:ay)?|cool|great|bye|good\s+(?:morning|afternoon|evening|night))"
+NO_TOOL = re.compile(rf"^{_GREETING}(?:[\s,]+(?:there|again|so\s+much|a\s+lot|{_GREETING}))*\s*[.!?]*$", re.I)
+
+# Other words for what a tool does, by tool name
+TOOL_WORDS = {"multiply": "times product multiplied", "add": "plus sum added", "divide": "divided quotient"}
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class NaiveBayes:
+    """Two-class multinomial naive Bayes over stemmed words, trained online."""
+
+    def __init__(self):
+        self.words = {True: Counter(), False: Counter()}
+        self.docs = Counter()
+        self.vocabulary = set()
+
+    def learn(self, text: str, label: bool) -> None:
+        words = tokenize(text)
+        self.words[label].update(words)
+        self.docs[label] += 1
+        self.vocabulary.update(words)
+
+    def predict(self, text: str) -> tuple[bool, float]:
+        """`(label, probability)`; the label is True when the text needs a tool."""
+        total = sum(self.docs.values())
+        scores = {}
+        for label in (True, False):
+            n = sum(self.words[label].values()) + len(self.vocabulary) + 1
+            score = math.log((self.docs[label] + 1) / (total + 2))
+            for word in tokenize(text):
+                score += math.log((self.words[label][word] + 1) / n)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over the two log scores
+        return best, 1 / (1 + math.exp(scores[not best] - scores[best]))
+
+
+class EarlyExitRouter:
+    """Route each request to a direct tool call, a small model or the full model.
+
+    Args:
+        tools: tools the rules may call directly (matched by name)
+        rules: `(regex, tool name, argument names)` patterns; the regex must match the whole message
+        min_confidence: probability the local model needs before sending a request to `small_llm`
+        min_examples: full-model decisions the local model learns from before it is used
+        audit: the full model (`messages -> AIMessage`), to check a sample of early exits
+        audit_rate: share of early exits checked against `audit` in the background
+        cache_size: decisions kept
+    """
+
+    def __init__(
+        self,
+        tools=(),
+        rules=RULES,
+        min_confidence: float = 0.95,
+        min_examples: int = 50,
+        audit=None,
+        audit_rate: float = 0.0,
+        cache_size: int = 4096,
+        rng: random.Random | None = None,
+    ):
+        names = {getattr(t, "name", None) or t.__name__ for t in tools}
+        self.rules = [rule for rule in rules if rule[1] in names]
+        # Requests mentioning a tool ("multiply", "times"...) never skip the tools
+        self.tool_words = set(tokenize(" ".join(f"{n} {TOOL_WORDS.get(n, '')}" for n in names)))
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.audit = audit
+        self.audit_rate = audit_rate
+        self.cache_size = cache_size
+        self.rng = rng or random.Random()
+        self.model = NaiveBayes()
+        self._cache = OrderedDict()
+        self._auditor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="early-exit-audit")
+
+    # Classification
+
+    def classify(self, text: str) -> tuple[str, dict | None]:
+        """`(route, tool call)` for a request; the tool call is only set for `direct_tool`."""
+        key = normalize(text)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            metrics.incr("router.cache_hits")
+            return self._cache[key]
+        start = time.perf_counter()
+        decision = self._classify(key)
+        metrics.incr("router.classify_seconds", time.perf_counter() - start)
+        # Model decisions may change as it learns: only rule decisions are cached
+        if decision[0] == "direct_tool" or NO_TOOL.match(key):
+            self._cache[key] = decision
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return decision
+
+    def _classify(self, text: str) -> tuple[str, dict | None]:
+        for pattern, tool, arg_names in self.rules:
+            match = pattern.match(text)
+            if match:
+                return "direct_tool", {"name": tool, "args": {n: int(v) for n, v in zip(arg_names, match.groups())}}
+        if NO_TOOL.match(text):
+            return "small_llm", None
+        if self.tool_words.intersection(tokenize(text)):
+            return "tool_calling_llm", None
+        if sum(self.model.docs.values()) >= self.min_examples:
+            needs_tool, confidence = self.model.predict(text)
+            if not needs_tool and confidence >= self.min_confidence:
+                return "small_llm", None
+        return "tool_calling_llm", None
+
+    @staticmethod
+    def _request(state) -> str | None:
+        last = state["messages"][-1]
+        return last.content if isinstance(last, HumanMessage) and isinstance(last.content, str) else None
+
+    def route(self, state) -> Literal["direct_tool", "small_llm", "tool_calling_llm"]:
+        """Conditional edge from START."""
+        text = self._request(state)
+        route = "tool_calling_llm" if text is None else self.classify(text)[0]
+        metrics.incr(f"router.{route}.calls")
+        return route
+
+    # Nodes
+
+    def direct_tool(self, state):
+        """Emit the tool call the rules matched, as the full model would have."""
+        start = time.perf_counter()
+        _, call = self.classify(self._request(state))
+        message = AIMessage(content="", tool_calls=[{**call, "id": f"call_{uuid.uuid4().hex[:24]}", "type": "tool_call"}])
+        self._maybe_audit("direct_tool", state["messages"], call)
+        metrics.incr("router.direct_tool.seconds", time.perf_counter() - start)
+        return {"messages": [message]}
+
+    def observe(self, route: str, node):
+        """Wrap the node of a model route: time it, and learn from (or audit) its decisions."""
+
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            start = time.perf_counter()
+            update = node(state, *args, **kwargs)
+            metrics.incr(f"router.{route}.seconds", time.perf_counter() - start)
+            text = self._request(state)
+            if text is not None and route == "tool_calling_llm":
+                used_tool = any(getattr(m, "tool_calls", None) for m in update.get("messages", []))
+                if sum(self.model.docs.values()) >= self.min_examples:
+                    # Would the local model have sent this request elsewhere?
+                    guess, confidence = self.model.predict(text)
+                    early = not guess and confidence >= self.min_confidence
+                    metrics.incr(f"router.local_model.{'disagree' if early and used_tool else 'agree'}")
+                self.model.learn(text, used_tool)
+            elif text is not None:
+                self._maybe_audit(route, state["messages"], None)
+            return update
+
+        return wrapper
+
+    # Accuracy
+
+    def _maybe_audit(self, route: str, messages, expected_call):
+        if self.audit is None or self.rng.random() >= self.audit_rate:
+            return
+        self._auditor.submit(self._audit, route, list(messages), expected_call)
+
+    def _audit(self, route: str, messages, expected_call):
+        try:
+            reference = self.audit(messages)
+        except Exception:
+            metrics.incr(f"router.{route}.audit_errors")
+            return
+        calls = [{"name": c["name"], "args": c["args"]} for c in getattr(reference, "tool_calls", [])]
+        # direct_tool must match the full model's call; small_llm must match "no tool"
+        agree = calls == ([expected_call] if expected_call else [])
+        metrics.incr(f"router.{route}.{'agree' if agree else 'disagree'}")
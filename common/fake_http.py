@@ -0,0 +1,180 @@
+"""A tiny local HTTP server for exercising tools without hitting real APIs.
+
+It can inject latency and errors, and it counts the requests it receives,
+so it can stand in for OpenWeatherMap (or any JSON API) in benchmarks and checks.
+
+    with FakeServer(weather_handler, latency=0.5, error_rate=0.2) as server:
+        os.environ["OPENWEATHERMAP_BASE_URL"] = server.url
+        ...
+        print(server.calls)
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _weather_payload(city: str, city_id: int = 5128581) -> dict:
+    return {
+        "coord": {"lon": -74.006, "lat": 40.7143},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "base": "stations",
+        "main": {
+            "temp": 21.3,
+            "feels_like": 20.9,
+            "temp_min": 19.8,
+            "temp_max": 22.6,
+            "pressure": 1018,
+            "humidity": 52,
+        },
+        "visibility": 10000,
+        "wind": {"speed": 3.6, "deg": 250},
+        "clouds": {"all": 0},
+        "dt": 1700000000,
+        "sys": {"country": "US", "sunrise": 1699960000, "sunset": 1699996000},
+        "timezone": -18000,
+        "id": city_id,
+        "name": city,
+        "cod": 200,
+    }
+
+
+def weather_handler(path: str, query: dict, body: bytes):
+    """Answer like the OpenWeatherMap `/data/2.5/weather` and `/data/2.5/group` endpoints."""
+    if path.endswith("/group"):
+        ids = [int(i) for i in query.get("id", [""])[0].split(",") if i]
+        payload = {"cnt": len(ids), "list": [_weather_payload(f"City {i}", i) for i in ids]}
+    else:
+        payload = _weather_payload(query.get("q", ["Nowhere"])[0])
+    return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+
+
+def chat_completions_handler(path: str, query: dict, body: bytes):
+    """Answer like the OpenAI `/v1/chat/completions` endpoint (non-streaming)."""
+    request = json.loads(body or b"{}")
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+    payload = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "This is a fake answer."},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 6,
+            "total_tokens": prompt_tokens + 6,
+        },
+    }
+    return 200, {"Content-Type": "application/json"}, json.dumps(payload).encode()
+
+
+class _Server(ThreadingHTTPServer):
+    # Room for bursts of concurrent clients (the stdlib default backlog is 5)
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeServer:
+    """Serve `handler(path, query, body) -> (status, headers, body)` on a free local port.
+
+    Args:
+        handler: function producing the response for a request
+        latency: seconds to sleep before answering
+        error_rate: probability (0-1) of answering with `error_status` instead
+        error_status: status code used for injected errors
+        retry_after: value of the Retry-After header sent with injected errors
+        seed: seed for the error injection, for reproducible runs
+    """
+
+    def __init__(
+        self,
+        handler=weather_handler,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after: float | None = None,
+        seed: int | None = None,
+    ):
+        self.handler = handler
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with fake._lock:
+                    fake.calls += 1
+                    inject_error = fake._rng.random() < fake.error_rate
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if inject_error:
+                    status, headers, payload = (
+                        fake.error_status,
+                        {"Content-Type": "application/json"},
+                        b'{"error": {"message": "injected", "type": "injected"}}',
+                    )
+                    if fake.retry_after is not None:
+                        headers["Retry-After"] = str(fake.retry_after)
+                else:
+                    url = urlparse(self.path)
+                    status, headers, payload = fake.handler(
+                        url.path, parse_qs(url.query), body
+                    )
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (e.g. a tool deadline passed)
+                    pass
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,112 @@
+"""Fan-out / fan-in helpers for graphs with many parallel branches.
+
+Reducers like `operator.add` or `reduce_list` are applied once per branch update: `left + right`
+copies the whole accumulated list every time, so merging n branches costs O(n^2).
+
+Two ways around it:
+
+- `ExtendList`: a channel that receives all the updates of a step at once and concatenates them
+  into a new list, one copy per step instead of one per branch
+- `run_branches` + `tree_reduce`: run the branches on a thread pool (or as coroutines) inside one node,
+  then merge the results pairwise, O(total items * log n) with a pure reducer"""
+
+import asyncio
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from langgraph.channels.base import BaseChannel
+
+
+class ExtendList(BaseChannel):
+    """Append-only list channel: use it as `Annotated[list, ExtendList]`.
+
+    A reducer sees one update at a time; a channel gets every update of a super-step together,
+    so the new value is built in one copy. The previous list is never mutated, so earlier state
+    snapshots (checkpoints, `stream_mode="values"`) keep their value.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, typ=list):
+        super().__init__(typ)
+        self.value = []
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ExtendList)
+
+    @property
+    def ValueType(self):
+        return self.typ
+
+    @property
+    def UpdateType(self):
+        return self.typ
+
+    def copy(self):
+        empty = self.__class__(self.typ)
+        empty.key = self.key
+        empty.value = self.value
+        return empty
+
+    def checkpoint(self):
+        return self.value
+
+    def from_checkpoint(self, checkpoint):
+        empty = self.__class__(self.typ)
+        empty.key = self.key
+        if isinstance(checkpoint, list):
+            empty.value = checkpoint
+        return empty
+
+    def update(self, values: Sequence) -> bool:
+        if not values:
+            return False
+        self.value = [*self.value, *chain.from_iterable(v for v in values if v)]
+        return True
+
+    def get(self) -> list:
+        return self.value
+
+    def is_available(self) -> bool:
+        return True
+
+
+def tree_reduce(reducer, parts: list):
+    """Merge `parts` pairwise (((a, b), (c, d)), ...) instead of left to right.
+
+    Each element is copied O(log n) times instead of O(n) with a left fold of `left + right`.
+    `reducer` must be associative; the order of the parts is preserved.
+    """
+    if not parts:
+        return []
+    while len(parts) > 1:
+        merged = [reducer(parts[i], parts[i + 1]) for i in range(0, len(parts) - 1, 2)]
+        if len(parts) % 2:
+            merged.append(parts[-1])
+        parts = merged
+    return parts[0]
+
+
+def run_branches(branch, inputs: list, max_workers: int = 32) -> list:
+    """Run `branch(x)` for every input on a thread pool and return the results in input order."""
+    if len(inputs) <= 1:
+        return [branch(x) for x in inputs]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(inputs))) as pool:
+        return list(pool.map(branch, inputs))
+
+
+async def arun_branches(branch, inputs: list, max_concurrency: int = 256) -> list:
+    """Await the coroutine `branch(x)` for every input, at most `max_concurrency` at a time."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(x):
+        async with semaphore:
+            return await branch(x)
+
+    return await asyncio.gather(*(bounded(x) for x in inputs))
+
+
+def fan_out(branch, reducer, inputs: list, max_workers: int = 32):
+    """Run the branches in parallel and tree-reduce their results."""
+    return tree_reduce(reducer, run_branches(branch, inputs, max_workers))
@@ -0,0 +1,235 @@
+"""One process serving several compiled graphs to many tenants, over a plain ASGI app.
+
+Each script used to compile its graph and call it directly, one process per script. `GraphServer` loads
+named graphs once (`"module:attribute"`, imported on first use) and runs them on asyncio:
+
+- every tenant's threads are isolated: the checkpointer sees `<tenant>:<thread_id>`, so tenants can't read
+  or write each other's threads; requests on the same thread run one at a time
+- each tenant has its own concurrency limit; a tenant with too many queued requests gets a 429,
+  without slowing the others down
+- `/stream` sends the graph's updates as server-sent events while it runs
+
+Endpoints (the tenant comes from the `X-Tenant` header):
+
+    GET  /graphs
+    POST /graphs/<graph>/threads/<thread_id>/invoke   {"messages": [{"role": "user", "content": "..."}]}
+    POST /graphs/<graph>/threads/<thread_id>/stream   same body, text/event-stream answer
+    GET  /graphs/<graph>/threads/<thread_id>/state
+
+Run it with any ASGI server, e.g. `uvicorn common.graph_server:app`, from the repo root."""
+
+import asyncio
+import importlib
+import json
+import re
+import time
+import weakref
+from collections import defaultdict
+
+from langchain_core.messages import BaseMessage, convert_to_messages, message_to_dict
+
+from common import metrics
+
+GRAPHS = {
+    "react": "mod1.mem_agent:react_graph",
+    "summary": "mod2.message_summ:graph",
+}
+
+_NAME = re.compile(r"^[\w.-]+$")
+_ROUTE = re.compile(r"^/graphs/(?P<graph>[\w-]+)/threads/(?P<thread>[\w.-]+)/(?P<action>invoke|stream|state)$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json(value):
+    """JSON-ready copy of graph state (messages become dicts)."""
+    if isinstance(value, BaseMessage):
+        return message_to_dict(value)
+    if isinstance(value, dict):
+        return {k: to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class GraphServer:
+    """ASGI app serving named compiled graphs with per-tenant limits and per-thread isolation.
+
+    Args:
+        graphs: name -> compiled graph, or "module:attribute" to import on first use
+        max_concurrency_per_tenant: graph runs of one tenant at the same time
+        max_queue_per_tenant: runs of one tenant waiting for a slot before new ones get a 429
+    """
+
+    def __init__(self, graphs: dict | None = None, max_concurrency_per_tenant: int = 4, max_queue_per_tenant: int = 32):
+        self.graphs = dict(GRAPHS if graphs is None else graphs)
+        self.max_concurrency_per_tenant = max_concurrency_per_tenant
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self._loaded = {}
+        self._tenant_slots = defaultdict(lambda: asyncio.Semaphore(self.max_concurrency_per_tenant))
+        self._tenant_waiting = defaultdict(int)
+        self._thread_locks = weakref.WeakValueDictionary()  # a lock lives while someone holds or waits for it
+
+    def graph(self, name: str):
+        """The compiled graph called `name`, imported once."""
+        if name not in self._loaded:
+            target = self.graphs.get(name)
+            if target is None:
+                raise HTTPError(404, f"Unknown graph '{name}'.")
+            if isinstance(target, str):
+                module, _, attribute = target.partition(":")
+                target = getattr(importlib.import_module(module), attribute)
+            self._loaded[name] = target
+        return self._loaded[name]
+
+    def _config(self, tenant: str, thread_id: str, body: dict) -> dict:
+        # Everything a tenant can name is prefixed with the tenant, so threads never cross tenants
+        return {
+            "configurable": {
+                "thread_id": f"{tenant}:{thread_id}",
+                "user_id": f"{tenant}:{body.get('user_id', 'default')}",
+            }
+        }
+
+    def _thread_lock(self, thread: str) -> asyncio.Lock:
+        lock = self._thread_locks.get(thread)
+        if lock is None:
+            lock = self._thread_locks[thread] = asyncio.Lock()
+        return lock
+
+    async def _slot(self, tenant: str):
+        slots = self._tenant_slots[tenant]
+        if slots.locked() and self._tenant_waiting[tenant] >= self.max_queue_per_tenant:
+            metrics.incr("server.rejected")
+            raise HTTPError(429, f"Too many concurrent requests for tenant '{tenant}'.")
+        self._tenant_waiting[tenant] += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._tenant_waiting[tenant] -= 1
+
+    async def _flush(self, graph, config):
+        # With a BatchingSaver, answer only once the run's final checkpoint is durable
+        # (only this thread's writes: other tenants' runs keep writing meanwhile)
+        flush = getattr(graph.checkpointer, "flush", None)
+        if flush is not None:
+            await asyncio.to_thread(flush, config["configurable"]["thread_id"])
+
+    async def run(self, name: str, tenant: str, thread_id: str, body: dict) -> dict:
+        """Run the graph on one turn and return its final state."""
+        graph = self.graph(name)
+        config = self._config(tenant, thread_id, body)
+        inputs = {"messages": convert_to_messages(body.get("messages", []))}
+        await self._slot(tenant)
+        try:
+            async with self._thread_lock(config["configurable"]["thread_id"]):
+                output = await graph.ainvoke(inputs, config)
+                await self._flush(graph, config)
+        finally:
+            self._tenant_slots[tenant].release()
+        return output
+
+    async def stream(self, name: str, tenant: str, thread_id: str, body: dict):
+        """Yield the graph's updates, node by node, while it runs."""
+        graph = self.graph(name)
+        config = self._config(tenant, thread_id, body)
+        inputs = {"messages": convert_to_messages(body.get("messages", []))}
+        await self._slot(tenant)
+        try:
+            async with self._thread_lock(config["configurable"]["thread_id"]):
+                async for update in graph.astream(inputs, config, stream_mode="updates"):
+                    yield update
+                await self._flush(graph, config)
+        finally:
+            self._tenant_slots[tenant].release()
+
+    async def state(self, name: str, tenant: str, thread_id: str) -> dict:
+        graph = self.graph(name)
+        snapshot = await graph.aget_state(self._config(tenant, thread_id, {}))
+        return snapshot.values
+
+    # ASGI
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        start = time.perf_counter()
+        headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+        tenant = headers.get("x-tenant", "default")
+        try:
+            if not _NAME.match(tenant):
+                raise HTTPError(400, "Invalid X-Tenant.")
+            body = await _read_body(receive)
+            if scope["path"] == "/graphs" and scope["method"] == "GET":
+                return await _send_json(send, 200, {"graphs": sorted(self.graphs)})
+            match = _ROUTE.match(scope["path"])
+            if match is None:
+                raise HTTPError(404, "Not found.")
+            name, thread_id, action = match["graph"], match["thread"], match["action"]
+            metrics.incr(f"server.requests.{action}")
+            if action == "state":
+                return await _send_json(send, 200, to_json(await self.state(name, tenant, thread_id)))
+            if scope["method"] != "POST":
+                raise HTTPError(405, "Use POST.")
+            if action == "invoke":
+                return await _send_json(send, 200, to_json(await self.run(name, tenant, thread_id, body)))
+            return await self._send_stream(send, self.stream(name, tenant, thread_id, body))
+        except HTTPError as e:
+            return await _send_json(send, e.status, {"error": str(e)})
+        except Exception as e:
+            metrics.incr("server.errors")
+            return await _send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            metrics.incr("server.seconds", time.perf_counter() - start)
+
+    async def _send_stream(self, send, updates):
+        # Take the slot (and fail with a 429) before the 200 goes out
+        first = await anext(updates, None)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+        try:
+            while first is not None:
+                await send({"type": "http.response.body", "body": f"data: {json.dumps(to_json(first))}\n\n".encode(), "more_body": True})
+                first = await anext(updates, None)
+            end = b"event: end\ndata: {}\n\n"
+        except Exception as e:
+            # The status is already sent: report the failure as the last event
+            metrics.incr("server.errors")
+            end = f"event: error\ndata: {json.dumps({'error': f'{type(e).__name__}: {e}'})}\n\n".encode()
+        await send({"type": "http.response.body", "body": end})
+
+
+async def _read_body(receive) -> dict:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    try:
+        return json.loads(raw) if raw else {}
+    except json.JSONDecodeError:
+        raise HTTPError(400, "The body must be JSON.")
+
+
+async def _send_json(send, status: int, payload) -> None:
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+app = GraphServer()
@@ -0,0 +1,133 @@
+"""An in-memory checkpointer with indexed history, lazy channel loading and cheap forks.
+
+`MemorySaver.list` (and so `graph.get_state_history`) walks every checkpoint of a thread,
+and loading a checkpoint deserializes every channel. On threads with thousands of checkpoints,
+debugging by replay gets slow. `IndexedMemorySaver` keeps, per thread, checkpoint ids sorted by
+step and by timestamp, so it can:
+
+- find the checkpoint at a step or at a point in time in O(log n) (`get_by_step`, `get_at_time`)
+- return a range of history without walking the rest (`history`)
+- deserialize a single channel of a checkpoint (`load_channel`)
+- fork a thread from any checkpoint by copying references to the serialized channels (`fork`)
+
+It relies on the storage layout of langgraph-checkpoint 2.x's `MemorySaver`
+(`storage[thread][ns][id]` and `blobs[(thread, ns, channel, version)]`)."""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from langgraph.checkpoint.memory import MemorySaver
+
+# Sorts after any checkpoint id, so (step, _LAST) is an upper bound for all ids of a step
+_LAST = "\uffff"
+
+
+class IndexedMemorySaver(MemorySaver):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (thread_id, checkpoint_ns) -> sorted [(step, checkpoint_id)] / [(ts, checkpoint_id)]
+        self._by_step = defaultdict(list)
+        self._by_ts = defaultdict(list)
+        self._index_lock = threading.Lock()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._index(
+            next_config["configurable"]["thread_id"],
+            next_config["configurable"].get("checkpoint_ns", ""),
+            metadata.get("step", -1),
+            checkpoint["ts"],
+            checkpoint["id"],
+        )
+        return next_config
+
+    def _index(self, thread_id, checkpoint_ns, step, ts, checkpoint_id):
+        key = (thread_id, checkpoint_ns)
+        with self._index_lock:
+            insort(self._by_step[key], (step, checkpoint_id))
+            insort(self._by_ts[key], (ts, checkpoint_id))
+
+    def _config(self, thread_id, checkpoint_ns, checkpoint_id):
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    def get_by_step(self, thread_id: str, step: int, checkpoint_ns: str = ""):
+        """The latest checkpoint written at `step`, or None."""
+        index = self._by_step[(thread_id, checkpoint_ns)]
+        i = bisect_right(index, (step, _LAST)) - 1
+        if i < 0 or index[i][0] != step:
+            return None
+        return self.get_tuple(self._config(thread_id, checkpoint_ns, index[i][1]))
+
+    def get_at_time(self, thread_id: str, when: datetime | str, checkpoint_ns: str = ""):
+        """The latest checkpoint written at or before `when` (a datetime or ISO timestamp), or None.
+
+        Checkpoint timestamps are UTC ISO strings, so `when` is converted to UTC first; a naive `when` is taken as UTC.
+        """
+        if isinstance(when, str):
+            when = datetime.fromisoformat(when)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        when = when.astimezone(timezone.utc).isoformat()
+        index = self._by_ts[(thread_id, checkpoint_ns)]
+        i = bisect_right(index, (when, _LAST)) - 1
+        if i < 0:
+            return None
+        return self.get_tuple(self._config(thread_id, checkpoint_ns, index[i][1]))
+
+    def history(self, thread_id: str, first_step: int, last_step: int, checkpoint_ns: str = ""):
+        """Checkpoints with `first_step <= step <= last_step`, oldest first."""
+        index = self._by_step[(thread_id, checkpoint_ns)]
+        lo = bisect_left(index, (first_step,))
+        hi = bisect_right(index, (last_step, _LAST))
+        for _, checkpoint_id in index[lo:hi]:
+            yield self.get_tuple(self._config(thread_id, checkpoint_ns, checkpoint_id))
+
+    def load_channel(self, config, channel: str):
+        """Deserialize a single channel of a checkpoint, without loading the others."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        saved, _, _ = self.storage[thread_id][checkpoint_ns][checkpoint_id]
+        checkpoint = self.serde.loads_typed(saved)
+        version = checkpoint["channel_versions"].get(channel)
+        if version is None:
+            return None
+        blob = self.blobs[(thread_id, checkpoint_ns, channel, version)]
+        if blob[0] == "empty":
+            return None
+        return self.serde.loads_typed(blob)
+
+    def fork(self, config, new_thread_id: str):
+        """Start `new_thread_id` from the checkpoint in `config`, sharing its serialized channels.
+
+        Returns the config to invoke (or replay) the new thread with.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        saved, metadata, _ = self.storage[thread_id][checkpoint_ns][checkpoint_id]
+        checkpoint = self.serde.loads_typed(saved)
+        # The serialized values are immutable bytes: the new thread can point to the same ones
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = self.blobs.get((thread_id, checkpoint_ns, channel, version))
+            if blob is not None:
+                self.blobs[(new_thread_id, checkpoint_ns, channel, version)] = blob
+        self.storage[new_thread_id][checkpoint_ns][checkpoint_id] = (saved, metadata, None)
+        step = self.serde.loads_typed(metadata).get("step", -1)
+        self._index(new_thread_id, checkpoint_ns, step, checkpoint["ts"], checkpoint_id)
+        return self._config(new_thread_id, checkpoint_ns, checkpoint_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self._index_lock:
+            for key in [k for k in self._by_step if k[0] == thread_id]:
+                del self._by_step[key]
+                del self._by_ts[key]
@@ -0,0 +1,399 @@
+"""One process-wide scheduler for every LLM call.
+
+Every script used to create its own `ChatOpenAI`, with no shared view of the provider's rate limits:
+under load we hit 429s and retried blindly. `get_llm` returns chat models that all go through one `LLMScheduler`:
+
+- token buckets for requests per minute and tokens per minute (estimated before the call, corrected after)
+- a priority queue: interactive turns (`INTERACTIVE`) go ahead of background work like summarization (`BACKGROUND`)
+- adaptive concurrency (AIMD): one more slot while latency stays under target, half the slots on a 429 or a slow call
+- 429s are retried by the scheduler, after the provider's `Retry-After`, instead of by each client;
+  transient failures (5xx, timeouts, dropped connections) are retried too, with exponential backoff
+- one shared HTTP connection pool
+- in trace mode (see `common.trace`), calls are recorded to or replayed from a trace file
+
+Limits come from the environment: LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY, LLM_TARGET_LATENCY."""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import openai
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from common import metrics
+from common.trace import get_trace
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+class RateLimited(Exception):
+    """Raised when a call is still rate limited after all retries."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        with self._lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self.tokens
+            return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        """Consume `amount` tokens; the balance may go negative (debt is paid by waiting)."""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class LLMScheduler:
+    """Admission control for LLM calls shared by every graph in the process.
+
+    Args:
+        rpm: requests per minute
+        tpm: tokens per minute (prompt + completion)
+        max_concurrency: upper bound for concurrent calls
+        target_latency: seconds; slower calls shrink the concurrency limit
+        max_retries: retries of a rate-limited or transiently failing call
+    """
+
+    def __init__(self, rpm: float = 500, tpm: float = 300_000, max_concurrency: int = 32, target_latency: float = 20.0, max_retries: int = 5):
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * 5))
+        self.tokens = TokenBucket(tpm / 60, tpm / 6)
+        self.max_concurrency = max_concurrency
+        self.limit = max(1, max_concurrency // 2)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.http_client = httpx.Client(limits=httpx.Limits(max_connections=max_concurrency * 2, max_keepalive_connections=max_concurrency))
+        self.http_async_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_concurrency * 2, max_keepalive_connections=max_concurrency))
+
+    def _acquire(self, priority: int, tokens: float, cancelled: threading.Event | None = None) -> bool:
+        """Wait for a slot; False if `cancelled` was set first (no slot taken)."""
+        ticket = (priority, next(self._seq))
+        queued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                    return False
+                if self._queue[0] == ticket and self.in_flight < self.limit:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait == 0:
+                        break
+                    # The head of the queue waits for the buckets; nobody overtakes it
+                    self._cond.wait(timeout=wait)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._queue)
+            self.in_flight += 1
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._cond.notify_all()
+        metrics.incr(f"llm.queue_seconds.p{priority}", time.monotonic() - queued)
+        return True
+
+    async def _aacquire(self, priority: int, tokens: float) -> None:
+        # Waiting happens in a thread, which cancelling the task would not stop: tell it to give up,
+        # and release the slot if it got one anyway
+        cancelled = threading.Event()
+        acquire = asyncio.ensure_future(asyncio.to_thread(self._acquire, priority, tokens, cancelled))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            cancelled.set()
+            with self._cond:
+                self._cond.notify_all()
+            acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or not f.result() or self._release(None))
+            raise
+
+    def _release(self, latency: float | None, rate_limited: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if rate_limited or (latency is not None and latency > self.target_latency):
+                self.limit = max(1, self.limit // 2)
+                metrics.incr("llm.concurrency_decreases")
+            elif latency is not None and self.limit < self.max_concurrency:
+                self.limit += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE, tokens: float = 1000):
+        """Hold one admission slot for the duration of a call (e.g. a whole stream)."""
+        self._acquire(priority, tokens)
+        start = time.monotonic()
+        outcome = {"rate_limited": False}
+        try:
+            yield outcome
+        finally:
+            latency = None if outcome["rate_limited"] else time.monotonic() - start
+            self._release(latency, outcome["rate_limited"])
+
+    def run(self, call, priority: int = INTERACTIVE, tokens: float = 1000):
+        """Run `call()` in a slot, retrying rate-limited (429) and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            with self.slot(priority, tokens) as outcome:
+                metrics.incr(f"llm.calls.p{priority}")
+                try:
+                    return call()
+                except Exception as e:
+                    delay = retry_delay(e, attempt)
+                    if delay is None or attempt == self.max_retries:
+                        raise _exhausted(e)
+                    outcome["rate_limited"] = is_rate_limited(e)
+            time.sleep(delay)
+
+    async def arun(self, call, priority: int = INTERACTIVE, tokens: float = 1000):
+        """Async `run`: `call()` returns an awaitable; waiting for a slot does not block the event loop."""
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire(priority, tokens)
+            start = time.monotonic()
+            latency, rate_limited = None, False
+            metrics.incr(f"llm.calls.p{priority}")
+            try:
+                result = await call()
+                latency = time.monotonic() - start
+                return result
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise _exhausted(e)
+                rate_limited = is_rate_limited(e)
+            finally:
+                # Also on cancellation: the slot is always given back
+                self._release(latency, rate_limited)
+            await asyncio.sleep(delay)
+
+    def settle_tokens(self, estimated: float, used: float) -> None:
+        """Correct the token bucket once the real usage is known."""
+        self.tokens.take(used - estimated)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def is_transient(error: Exception) -> bool:
+    """Failures the OpenAI client would retry: timeouts, dropped connections, 408, 409 and 5xx."""
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in (408, 409) or status >= 500)
+
+
+def retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying after `error`, or None if it must not be retried."""
+    if is_rate_limited(error):
+        metrics.incr("llm.rate_limited")
+        return retry_after(error)
+    if is_transient(error):
+        metrics.incr("llm.transient_errors")
+        # Same schedule as the OpenAI client: 0.5s doubling up to 8s, with jitter
+        return min(8.0, 0.5 * 2**attempt) * random.uniform(0.75, 1.0)
+    return None
+
+
+def _exhausted(error: Exception) -> Exception:
+    """What to raise once a call gives up."""
+    if is_rate_limited(error):
+        return RateLimited("Still rate limited after all retries.")
+    return error
+
+
+def retry_after(error: Exception, default: float = 1.0) -> float:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                rpm=float(os.environ.get("LLM_RPM", 500)),
+                tpm=float(os.environ.get("LLM_TPM", 300_000)),
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 32)),
+                target_latency=float(os.environ.get("LLM_TARGET_LATENCY", 20)),
+            )
+        return _scheduler
+
+
+def estimate_tokens(messages, max_output: int = 512) -> int:
+    # About 4 characters per token, plus room for the answer
+    return sum(len(str(m.content)) for m in messages) // 4 + max_output
+
+
+def _encode_result(result: ChatResult) -> dict:
+    return {
+        "generations": [{"message": message_to_dict(g.message), "info": g.generation_info} for g in result.generations],
+        "llm_output": result.llm_output,
+    }
+
+
+def _decode_result(data: dict) -> ChatResult:
+    return ChatResult(
+        generations=[ChatGeneration(message=messages_from_dict([g["message"]])[0], generation_info=g["info"]) for g in data["generations"]],
+        llm_output=data["llm_output"],
+    )
+
+
+def _encode_chunk(chunk: ChatGenerationChunk) -> dict:
+    return {"message": message_to_dict(chunk.message), "info": chunk.generation_info}
+
+
+def _decode_chunk(data: dict) -> ChatGenerationChunk:
+    return ChatGenerationChunk(message=messages_from_dict([data["message"]])[0], generation_info=data["info"])
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose calls are admitted by the process-wide scheduler (and recorded / replayed in trace mode)."""
+
+    priority: int = INTERACTIVE
+
+    def _trace_request(self, messages, stop, kwargs) -> dict:
+        # What identifies a call in a trace: message ids and the like change from run to run
+        return {
+            "model": self.model_name,
+            "messages": [(m.type, m.content, getattr(m, "tool_calls", None) or []) for m in messages],
+            "stop": stop,
+            "tools": sorted(t.get("function", {}).get("name", "") for t in kwargs.get("tools", [])),
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return get_trace().call(
+            "llm",
+            self.model_name,
+            self._trace_request(messages, stop, kwargs),
+            lambda: self._scheduled_generate(messages, stop, run_manager, **kwargs),
+            _encode_result,
+            _decode_result,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await get_trace().acall(
+            "llm",
+            self.model_name,
+            self._trace_request(messages, stop, kwargs),
+            lambda: self._scheduled_agenerate(messages, stop, run_manager, **kwargs),
+            _encode_result,
+            _decode_result,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield from get_trace().stream(
+            "llm",
+            self.model_name,
+            self._trace_request(messages, stop, kwargs),
+            lambda: self._scheduled_stream(messages, stop, run_manager, **kwargs),
+            _encode_chunk,
+            _decode_chunk,
+        )
+
+    def _scheduled_generate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = get_scheduler()
+        estimated = estimate_tokens(messages, self.max_tokens or 512)
+        result = scheduler.run(
+            lambda: super(ScheduledChatOpenAI, self)._generate(messages, stop, run_manager, **kwargs),
+            self.priority,
+            estimated,
+        )
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            scheduler.settle_tokens(estimated, usage["total_tokens"])
+        return result
+
+    async def _scheduled_agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = estimate_tokens(messages, self.max_tokens or 512)
+        return await get_scheduler().arun(
+            lambda: super(ScheduledChatOpenAI, self)._agenerate(messages, stop, run_manager, **kwargs),
+            self.priority,
+            estimated,
+        )
+
+    def _scheduled_stream(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = get_scheduler()
+        estimated = estimate_tokens(messages, self.max_tokens or 512)
+        for attempt in range(scheduler.max_retries + 1):
+            started = False
+            with scheduler.slot(self.priority, estimated) as outcome:
+                metrics.incr(f"llm.calls.p{self.priority}")
+                try:
+                    for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    # Chunks already sent can't be taken back: only a stream that failed before its first chunk is retried
+                    delay = None if started else retry_delay(e, attempt)
+                    if delay is None or attempt == scheduler.max_retries:
+                        raise _exhausted(e)
+                    outcome["rate_limited"] = is_rate_limited(e)
+            time.sleep(delay)
+
+
+_models = {}
+
+
+def get_llm(model: str = "gpt-4o", priority: int = INTERACTIVE, **kwargs) -> ChatOpenAI:
+    """A chat model that shares the scheduler and connection pool with every other model in the process.
+
+    Args:
+        model: model name
+        priority: INTERACTIVE for user-facing turns, BACKGROUND for work that can wait
+        kwargs: other ChatOpenAI settings (temperature, base_url...)
+    """
+    key = (model, priority, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    with _scheduler_lock:
+        cached = _models.get(key)
+    if cached is not None:
+        return cached
+    scheduler = get_scheduler()
+    # A replayed run never reaches the provider, so it needs no real key
+    kwargs.setdefault("api_key", os.environ.get("OPENAI_API_KEY") or ("replay" if get_trace().mode == "replay" else None))
+    llm = ScheduledChatOpenAI(
+        model=model,
+        priority=priority,
+        # The scheduler retries 429s and transient failures; the client must not retry them on its own
+        max_retries=0,
+        http_client=scheduler.http_client,
+        http_async_client=scheduler.http_async_client,
+        **kwargs,
+    )
+    with _scheduler_lock:
+        return _models.setdefault(key, llm)
@@ -0,0 +1,280 @@
+"""Cross-thread long-term memory: embedded facts in a memory-mapped file with an ANN index.
+
+The checkpointer only remembers within one thread, and recalling something means replaying the whole message list.
+`VectorMemoryStore` keeps key facts for a user across threads:
+
+- facts are embedded by a pluggable local embedder (any `str -> vector` callable; `HashingEmbedder` needs no model)
+- vectors live in a memory-mapped float32 file next to a JSONL file with the texts, so the store survives restarts
+  and is paged in by the OS instead of loaded in full
+- an IVF index (k-means centroids + inverted lists) narrows each query to the `nprobe` closest lists,
+  so recall scans a few thousand vectors instead of all of them; the vectors of each list are stored
+  contiguously (`<path>.ivf.f32`), so a probe reads one slice instead of gathering rows
+- a search within one namespace (one user) is exact while the namespace is small, which is the usual case:
+  a user's facts are scattered over the lists of a shared index, so probing the closest lists would miss them;
+  larger namespaces keep probing lists until `k` of their facts are found
+
+`extract_facts` picks the sentences worth keeping from a user message (what the user says about themselves),
+and only the top-k facts are injected into the prompt.
+
+Requires numpy."""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from common import metrics
+
+
+# First-person statements worth remembering: "I live in Berlin", "my dog is called Rex", "call me Sam"...
+_FACT = re.compile(
+    r"^(?:i(?:'m| am| was| have| had| live| work| like| love| prefer| hate| don't| do not| usually| always| never)\b"
+    r"|my \w+(?: \w+)? (?:is|are|was|were|has|have)\b|call me\b|remember that\b)",
+    re.I,
+)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def extract_facts(text: str) -> list[str]:
+    """The sentences of a user message that state something about the user, worth keeping across threads.
+
+    Requests ("Multiply that by 2.") and questions are dropped.
+    """
+    facts = []
+    for sentence in _SENTENCE.split(text.strip()):
+        sentence = re.sub(r"^(?:and|also|so|btw|by the way)[,\s]+", "", sentence.strip(), flags=re.I)
+        if _FACT.match(sentence) and not sentence.endswith("?"):
+            facts.append(sentence)
+    return facts
+
+
+class HashingEmbedder:
+    """A dependency-free embedder: hashed word unigrams and bigrams, L2-normalized.
+
+    Good enough to find facts that share words with the query. Swap in any local model
+    (e.g. a sentence-transformers `encode`) for semantic recall.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorMemoryStore:
+    """Persistent vector store with an IVF approximate-nearest-neighbour index.
+
+    Args:
+        path: file prefix; creates `<path>.f32` (vectors), `<path>.jsonl` (texts and metadata)
+            and `<path>.ivf.f32` (vectors in list order, once the index is built)
+        embedder: `str -> vector` callable
+        dim: vector size (must match the embedder)
+        n_lists: number of IVF lists (about sqrt(n) is a good choice; 1024 for a million facts)
+        nprobe: lists scanned per query, at least
+        train_after: build the index once the store holds this many facts (exact search before)
+        exact_below: namespaces with at most this many facts are searched exactly
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedder=None,
+        dim: int = 256,
+        n_lists: int = 1024,
+        nprobe: int = 8,
+        train_after: int = 20_000,
+        exact_below: int = 4096,
+    ):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder(dim)
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_after = train_after
+        self.exact_below = exact_below
+        self._lock = threading.Lock()
+        self._records = []
+        if os.path.exists(f"{path}.jsonl"):
+            with open(f"{path}.jsonl") as f:
+                self._records = [json.loads(line) for line in f]
+        self._capacity = max(1024, len(self._records))
+        self._open(self._capacity)
+        # Namespace of every fact as a small int, so filtering is one vectorized comparison
+        self._namespaces = {}
+        self._ns = np.zeros(self._capacity, dtype=np.int32)
+        self._rows = []  # namespace code -> ids of its facts
+        self._row_arrays = {}
+        for i, record in enumerate(self._records):
+            self._ns[i] = self._code(record["namespace"])
+            self._rows[self._ns[i]].append(i)
+        self.centroids = None
+        if len(self._records) >= self.train_after:
+            self.build_index()
+
+    def _open(self, capacity: int):
+        mode = "r+" if os.path.exists(f"{self.path}.f32") else "w+"
+        if mode == "r+" and os.path.getsize(f"{self.path}.f32") < capacity * self.dim * 4:
+            with open(f"{self.path}.f32", "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+        self._vectors = np.memmap(f"{self.path}.f32", dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+
+    def _code(self, namespace: str) -> int:
+        code = self._namespaces.get(namespace)
+        if code is None:
+            code = self._namespaces[namespace] = len(self._rows)
+            self._rows.append([])
+        return code
+
+    def _grow(self, size: int):
+        while size > self._capacity:
+            # Grow the file geometrically
+            self._vectors.flush()
+            self._capacity *= 2
+            self._open(self._capacity)
+            self._ns = np.resize(self._ns, self._capacity)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, text: str, namespace: str = "default", **metadata) -> int:
+        """Store a fact for `namespace` (e.g. a user id) and return its id."""
+        vector = self.embedder(text)
+        with self._lock:
+            i = len(self._records)
+            self._grow(i + 1)
+            self._vectors[i] = vector
+            code = self._ns[i] = self._code(namespace)
+            self._rows[code].append(i)
+            self._row_arrays.pop(code, None)
+            record = {"text": text, "namespace": namespace, **metadata}
+            self._records.append(record)
+            with open(f"{self.path}.jsonl", "a") as f:
+                f.write(json.dumps(record) + "\n")
+            if self.centroids is not None:
+                self._extra[int(np.argmax(self.centroids @ vector))].append(i)
+            elif len(self._records) == self.train_after:
+                self.build_index()
+        metrics.incr("memory.added")
+        return i
+
+    def add_batch(self, texts: list[str], namespace: str = "default", vectors=None) -> None:
+        """Store many facts at once (vectors may be given precomputed)."""
+        if vectors is None:
+            vectors = np.stack([self.embedder(t) for t in texts])
+        with self._lock:
+            start = len(self._records)
+            self._grow(start + len(texts))
+            self._vectors[start : start + len(texts)] = vectors
+            code = self._code(namespace)
+            self._ns[start : start + len(texts)] = code
+            self._rows[code].extend(range(start, start + len(texts)))
+            self._row_arrays.pop(code, None)
+            records = [{"text": t, "namespace": namespace} for t in texts]
+            self._records.extend(records)
+            with open(f"{self.path}.jsonl", "a") as f:
+                f.writelines(json.dumps(r) + "\n" for r in records)
+            if self.centroids is not None:
+                for offset, c in enumerate(np.argmax(vectors @ self.centroids.T, axis=1)):
+                    self._extra[c].append(start + offset)
+            elif len(self._records) >= self.train_after:
+                self.build_index()
+        metrics.incr("memory.added", len(texts))
+
+    def build_index(self, iterations: int = 10, sample: int = 100_000, seed: int = 0):
+        """Train the IVF centroids (spherical k-means on a sample) and lay the vectors out list by list."""
+        n = len(self._records)
+        vectors = self._vectors[:n]
+        rng = np.random.default_rng(seed)
+        n_lists = min(self.n_lists, n)
+        train = vectors[rng.choice(n, size=min(sample, n), replace=False)]
+        centroids = train[rng.choice(len(train), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the old centroid for empty lists
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        assignment = np.concatenate(
+            [
+                np.argmax(vectors[start : start + 65_536] @ centroids.T, axis=1)
+                for start in range(0, n, 65_536)
+            ]
+        )
+        order = np.argsort(assignment, kind="stable")
+        # IVF-flat: list c is rows bounds[c]:bounds[c + 1] of a copy of the vectors sorted by list
+        ivf = np.memmap(f"{self.path}.ivf.f32", dtype=np.float32, mode="w+", shape=(max(n, 1), self.dim))
+        for start in range(0, n, 65_536):
+            ivf[start : start + 65_536] = vectors[order[start : start + 65_536]]
+        ivf.flush()
+        self.centroids = centroids
+        self._bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self._ivf_ids = order
+        self._ivf_vectors = ivf
+        self._extra = [[] for _ in range(n_lists)]  # ids added after the build, per list
+        metrics.incr("memory.index_builds")
+
+    def search(self, query: str, k: int = 3, namespace: str | None = "default") -> list[dict]:
+        """The `k` stored facts closest to `query` (cosine similarity), best first."""
+        vector = self.embedder(query)
+        with self._lock:
+            code = None
+            if namespace is not None:
+                code = self._namespaces.get(namespace)
+                if code is None:
+                    return []
+            if code is not None and (self.centroids is None or len(self._rows[code]) <= self.exact_below):
+                ids = self._row_array(code)
+                scores = self._vectors[ids] @ vector
+            elif self.centroids is None:
+                ids = np.arange(len(self._records))
+                scores = self._vectors[: len(ids)] @ vector
+            else:
+                ids, scores = self._probe(vector, k, code)
+            if not len(ids):
+                return []
+            top = np.argpartition(-scores, k - 1)[:k] if len(ids) > k else np.arange(len(ids))
+            top = top[np.argsort(-scores[top])]
+            metrics.incr("memory.searches")
+            return [{**self._records[ids[j]], "score": float(scores[j])} for j in top]
+
+    def _probe(self, vector, k: int, code: int | None):
+        """Scan the lists closest to `vector`: at least `nprobe`, and until `k` facts of the namespace are found."""
+        ids, scores, found, probed = [], [], 0, 0
+        for c in np.argsort(-(self.centroids @ vector)):
+            if probed >= self.nprobe and found >= k:
+                break
+            probed += 1
+            lo, hi = self._bounds[c], self._bounds[c + 1]
+            list_ids, list_scores = self._ivf_ids[lo:hi], self._ivf_vectors[lo:hi] @ vector
+            if self._extra[c]:
+                extra = np.asarray(self._extra[c], dtype=np.int64)
+                list_ids = np.concatenate([list_ids, extra])
+                list_scores = np.concatenate([list_scores, self._vectors[extra] @ vector])
+            if code is not None:
+                keep = self._ns[list_ids] == code
+                list_ids, list_scores = list_ids[keep], list_scores[keep]
+            ids.append(list_ids)
+            scores.append(list_scores)
+            found += len(list_ids)
+        metrics.incr("memory.lists_probed", probed)
+        return np.concatenate(ids), np.concatenate(scores)
+
+    def _row_array(self, code: int):
+        array = self._row_arrays.get(code)
+        if array is None:
+            array = self._row_arrays[code] = np.asarray(self._rows[code], dtype=np.int64)
+        return array
+
+    def flush(self):
+        self._vectors.flush()
@@ -0,0 +1,29 @@
+"""Process-wide counters shared by the helpers in this folder.
+
+Every helper (tool guards, caches, budgets, schedulers...) reports into the same
+registry, so one call to `snapshot()` shows what the graphs in this process did."""
+
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name: str, amount: float = 1) -> None:
+    """Add `amount` to the counter called `name`."""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot(prefix: str = "") -> dict:
+    """Return a copy of all counters, optionally only those starting with `prefix`."""
+    with _lock:
+        return {k: v for k, v in _counters.items() if k.startswith(prefix)}
+
+
+def reset(prefix: str = "") -> None:
+    """Drop all counters (or only those starting with `prefix`)."""
+    with _lock:
+        for k in [k for k in _counters if k.startswith(prefix)]:
+            del _counters[k]
@@ -0,0 +1,163 @@
+"""Sampled per-node profiling of graph runs (cProfile + tracemalloc).
+
+    profiler = GraphProfiler(sample_rate=0.01)
+    builder.add_node("assistant", profiler.node("assistant", assistant))
+    ...
+    output = profiler.invoke(graph, inputs, config)
+
+Only a sampled fraction of runs is profiled (GRAPH_PROFILE_RATE, default 0), so it can stay on in production.
+For a sampled run, every node's CPU time is profiled separately and, optionally, the memory it allocated.
+The results go to `<out_dir>/<run id>/`:
+
+- `profile.folded`: collapsed stacks (`node;module:function;... microseconds`), for flamegraph.pl, speedscope or inferno
+- `<node>.pstats`: the raw cProfile stats, for pstats / snakeviz
+- `<node>.alloc.txt`: top allocation sites of the node (tracemalloc)
+
+Stacks are rebuilt from cProfile's caller graph, so a function reached from several callers
+has its time split between them in proportion to their cumulative time.
+tracemalloc is process-wide: with nodes running in parallel, their allocations can mix."""
+
+import contextvars
+import cProfile
+import functools
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from common import metrics
+
+_current_run = contextvars.ContextVar("profiled_run", default=None)
+
+
+class _Run:
+    def __init__(self, path: str, trace_memory: bool):
+        self.path = path
+        self.trace_memory = trace_memory
+        self.profiles = {}  # node -> cProfile.Profile (accumulates over repeated calls)
+        self.allocations = {}  # node -> list of tracemalloc StatisticDiff
+        self.lock = threading.Lock()
+
+
+class GraphProfiler:
+    """Profile a sample of graph runs, node by node.
+
+    Args:
+        out_dir: where the profiles of sampled runs are written
+        sample_rate: share of runs to profile (0-1); defaults to GRAPH_PROFILE_RATE or 0
+        trace_memory: also record allocations with tracemalloc (slower)
+        top_allocations: allocation sites kept per node
+    """
+
+    def __init__(self, out_dir: str = "profiles", sample_rate: float | None = None, trace_memory: bool = True, top_allocations: int = 25):
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("GRAPH_PROFILE_RATE", 0))
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.trace_memory = trace_memory
+        self.top_allocations = top_allocations
+
+    def node(self, name: str, fn):
+        """Wrap a node so its CPU time (and allocations) are recorded in sampled runs."""
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            run = _current_run.get()
+            if run is None:
+                return fn(*args, **kwargs)
+            with run.lock:
+                profile = run.profiles.setdefault(name, cProfile.Profile())
+            before = tracemalloc.take_snapshot() if run.trace_memory else None
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active (e.g. a parallel node on Python 3.12+)
+                metrics.incr("profiling.skipped_nodes")
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                if before is not None:
+                    diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                    with run.lock:
+                        run.allocations.setdefault(name, []).extend(diff[: self.top_allocations])
+
+        return wrapper
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def invoke(self, graph, *args, **kwargs):
+        """`graph.invoke(...)`, profiled if this run is sampled."""
+        if not self.sampled():
+            return graph.invoke(*args, **kwargs)
+        run = _Run(os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"), self.trace_memory)
+        started_tracing = run.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        token = _current_run.set(run)
+        try:
+            return graph.invoke(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+            if started_tracing:
+                tracemalloc.stop()
+            self._write(run)
+            metrics.incr("profiling.runs")
+
+    def _write(self, run: _Run):
+        os.makedirs(run.path, exist_ok=True)
+        with open(os.path.join(run.path, "profile.folded"), "w") as folded:
+            for node, profile in run.profiles.items():
+                stats = pstats.Stats(profile)
+                stats.dump_stats(os.path.join(run.path, f"{node}.pstats"))
+                for stack, micros in folded_stacks(stats):
+                    folded.write(f"{node};{';'.join(stack)} {micros}\n")
+        for node, diffs in run.allocations.items():
+            with open(os.path.join(run.path, f"{node}.alloc.txt"), "w") as f:
+                for diff in sorted(diffs, key=lambda d: -d.size_diff)[: self.top_allocations]:
+                    f.write(f"{diff}\n")
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    module = os.path.splitext(os.path.basename(filename))[0] if filename != "~" else "builtins"
+    return f"{module}:{name}:{line}" if line else f"{module}:{name}"
+
+
+def folded_stacks(stats: pstats.Stats, max_depth: int = 64, min_share: float = 1e-4):
+    """Rebuild `(stack, microseconds)` pairs from cProfile's caller graph."""
+    raw = stats.stats  # func -> (cc, nc, tottime, cumtime, callers)
+    memo = {}
+
+    def paths(func, seen):
+        # Call paths from a root to `func`, each with the share of func's time it accounts for
+        if func in memo:
+            return memo[func]
+        callers = raw[func][4] if func in raw else {}
+        callers = {c: v for c, v in callers.items() if c not in seen and c in raw}
+        if not callers or len(seen) >= max_depth:
+            result = [((_label(func),), 1.0)]
+        else:
+            total = sum(v[3] for v in callers.values()) or len(callers)
+            result = []
+            for caller, v in callers.items():
+                share = (v[3] or 1) / total
+                for path, w in paths(caller, seen | {func}):
+                    if w * share >= min_share:
+                        result.append((path + (_label(func),), w * share))
+        if not seen:
+            memo[func] = result
+        return result
+
+    for func, (_, _, tottime, _, _) in raw.items():
+        if tottime <= 0 or "_lsprof.Profiler" in func[2]:
+            continue
+        for path, share in paths(func, frozenset()):
+            micros = int(tottime * share * 1e6)
+            if micros:
+                yield path, micros
@@ -0,0 +1,101 @@
+"""Result cache for pure (deterministic, side-effect free) tools.
+
+Mark a tool with `@pure` and its results are cached by canonicalized arguments
+(`add(3, 4)`, `add(a=3, b=4)` and `add(b=4, a=3)` are the same entry) in a bounded LRU.
+The default cache is shared by every graph and thread in the process,
+so an expensive pure tool runs once per distinct input.
+
+Exceptions are not cached. Hits, misses and evictions are reported to `common.metrics`."""
+
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+
+from common import metrics
+from common.trace import get_trace
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU mapping."""
+
+    def __init__(self, max_entries: int = 4096, name: str = "pure_cache"):
+        self.max_entries = max_entries
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                metrics.incr(f"{self.name}.hits")
+                return self._data[key]
+        metrics.incr(f"{self.name}.misses")
+        return default
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                metrics.incr(f"{self.name}.evictions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "max_entries": self.max_entries, **metrics.snapshot(f"{self.name}.")}
+
+
+SHARED_CACHE = LRUCache()
+
+
+def canonical_args(signature: inspect.Signature, args, kwargs) -> str:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, default=repr)
+
+
+def pure(func=None, *, cache: LRUCache = SHARED_CACHE):
+    """Mark a tool as pure and cache its results.
+
+    Can be used as `@pure` or `@pure(cache=my_cache)`.
+    """
+
+    def decorate(fn):
+        signature = inspect.signature(fn)
+        prefix = f"{fn.__module__}.{fn.__qualname__}:"
+
+        def cached(*args, **kwargs):
+            key = prefix + canonical_args(signature, args, kwargs)
+            result = cache.get(key)
+            if result is _MISSING:
+                result = fn(*args, **kwargs)
+                cache.put(key, result)
+            return result
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Recorded / replayed in trace mode (see common.trace)
+            return get_trace().tool(fn.__name__, cached, args, kwargs)
+
+        wrapper.is_pure = True
+        return wrapper
+
+    if func is not None:
+        return decorate(func)
+    return decorate
+
+
+def cache_stats() -> dict:
+    """Entries and hit / miss / eviction counts of the shared cache."""
+    return SHARED_CACHE.stats()
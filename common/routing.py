@@ -0,0 +1,13 @@
+"""Seeded randomness for routers.
+
+`routing_rng` gives routers that pick at random (load tests, A/B splits) a reproducible source of randomness."""
+
+import os
+import random
+
+
+def routing_rng(seed: int | None = None, env: str = "ROUTING_SEED") -> random.Random:
+    """A random generator for routers, seeded from `seed` or the `ROUTING_SEED` env var when set."""
+    if seed is None and os.environ.get(env):
+        seed = int(os.environ[env])
+    return random.Random(seed)
@@ -0,0 +1,94 @@
+"""Single-flight request coalescing with a short TTL cache.
+
+When many callers ask for the same key at once, only the first one (the leader)
+calls upstream. The others wait for the leader and get the same result (or the same exception).
+Successful results are then served from memory for `ttl` seconds.
+
+    weather_flight = SingleFlight(ttl=60)
+    weather_flight.do("new york", lambda: fetch("New York"))
+"""
+
+import threading
+import time
+
+from common import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key.
+
+    Args:
+        ttl: seconds a successful result keeps being served without calling upstream (0 disables caching)
+        max_entries: bound on the number of cached results
+        name: prefix for the counters reported to `common.metrics`
+        cache_if: decides whether a result may be cached (e.g. skip error payloads)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 0.0,
+        max_entries: int = 1024,
+        name: str = "single_flight",
+        cache_if=None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = name
+        self.cache_if = cache_if or (lambda result: True)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._cache = {}
+
+    def do(self, key, fn):
+        """Return `fn()`, sharing the call with any concurrent caller using the same key."""
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                metrics.incr(f"{self.name}.cache_hits")
+                return cached[1]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+
+        if not leader:
+            metrics.incr(f"{self.name}.coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.incr(f"{self.name}.upstream_calls")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and self.ttl > 0 and self.cache_if(call.result):
+                    if len(self._cache) >= self.max_entries:
+                        self._evict()
+                    self._cache[key] = (time.monotonic() + self.ttl, call.result)
+            call.done.set()
+        return call.result
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        if len(self._cache) >= self.max_entries:
+            # Still full: drop the entry that expires first
+            del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
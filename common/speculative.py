@@ -0,0 +1,153 @@
+"""Start tools while the LLM is still streaming its answer.
+
+Normally a tool starts only after the full LLM response has arrived. `SpeculativeExecutor.stream`
+streams the response instead, and submits each tool call to a thread pool as soon as its
+argument object is complete JSON, overlapping LLM generation with tool I/O.
+
+It can also prefetch: start a likely call (e.g. `fetch_weather` for a city named in the question)
+before the LLM has even answered. If the final tool call matches, its result is reused; otherwise
+the prefetch is cancelled (or its result ignored if it already runs).
+
+`should_start` lets the caller veto early starts, e.g. a step budget that would answer the call from
+its memo or not run it at all; vetoed calls run (or not) when their results are collected, and
+`discard` drops calls that were started but will never be collected.
+
+Only use it with tools that are safe to run speculatively (reads, pure functions)."""
+
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import ToolMessage
+
+from common import metrics
+
+
+def call_key(name: str, args: dict) -> str:
+    return f"{name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+def _run_tool(tool, args: dict):
+    # Works for tools (StructuredTool...) as well as plain functions
+    if hasattr(tool, "invoke"):
+        return tool.invoke(args)
+    return tool(**args)
+
+
+class SpeculativeExecutor:
+    """Run tool calls as soon as they are complete in the LLM stream.
+
+    Args:
+        tools: the tools the model can call
+        max_workers: tools running at the same time
+        max_pending: started calls kept around until their results are collected
+    """
+
+    def __init__(self, tools, max_workers: int = 8, max_pending: int = 1024):
+        self.tools = {getattr(t, "name", None) or t.__name__: t for t in tools}
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._pending = OrderedDict()  # tool_call_id -> Future
+        self._lock = threading.Lock()
+
+    def _execute(self, name, args):
+        # Counted here, where the tool actually runs
+        metrics.incr("speculative.executed")
+        return _run_tool(self.tools[name], args)
+
+    def _submit(self, name, args):
+        return self._pool.submit(self._execute, name, args)
+
+    def _track(self, tool_call_id, future):
+        with self._lock:
+            self._pending[tool_call_id] = future
+            while len(self._pending) > self.max_pending:
+                # Never collected (e.g. answered from a memo instead)
+                _, stale = self._pending.popitem(last=False)
+                stale.cancel()
+
+    def stream(self, llm, messages, prefetch=(), should_start=None, **kwargs):
+        """Stream `llm` on `messages` and start tools as their calls complete.
+
+        Args:
+            llm: chat model (bound to the tools)
+            messages: the prompt
+            prefetch: `(tool name, args)` pairs to start right away, before the LLM answers
+            should_start: function of a tool call (`{"name", "args", "id"}`) returning whether it may
+                start before the response is complete; called once per call, prefetches included
+
+        Returns the full AI message; collect tool results with `result` or `invoke`.
+        """
+        prefetched = {}
+        for name, args in prefetch:
+            if name in self.tools and (should_start is None or should_start({"name": name, "args": args, "id": None})):
+                metrics.incr("speculative.prefetched")
+                prefetched[call_key(name, args)] = self._submit(name, args)
+
+        full = None
+        started = set()
+        for chunk in llm.stream(messages, **kwargs):
+            full = chunk if full is None else full + chunk
+            for call in full.tool_call_chunks:
+                index = call.get("index")
+                if index in started or not call.get("id") or call.get("name") not in self.tools:
+                    continue
+                try:
+                    args = json.loads(call.get("args") or "")
+                except json.JSONDecodeError:
+                    continue  # Still streaming
+                if not isinstance(args, dict):
+                    continue
+                started.add(index)
+                future = prefetched.pop(call_key(call["name"], args), None)
+                if future is None and should_start is not None and not should_start({"name": call["name"], "args": args, "id": call["id"]}):
+                    metrics.incr("speculative.held_back")
+                    continue
+                if future is not None:
+                    metrics.incr("speculative.prefetch_hits")
+                else:
+                    metrics.incr("speculative.started_early")
+                    future = self._submit(call["name"], args)
+                self._track(call["id"], future)
+
+        for future in prefetched.values():
+            metrics.incr("speculative.prefetch_wasted")
+            future.cancel()
+        return full
+
+    def result(self, tool_call: dict):
+        """Result of a tool call: the speculative one if it was started, otherwise run now."""
+        with self._lock:
+            future = self._pending.pop(tool_call["id"], None)
+        if future is not None:
+            return future.result()
+        metrics.incr("speculative.started_late")
+        return self._execute(tool_call["name"], tool_call["args"])
+
+    def discard(self, tool_calls) -> None:
+        """Forget calls whose results will not be collected (answered from a memo, or over budget)."""
+        with self._lock:
+            futures = [self._pending.pop(call["id"], None) for call in tool_calls]
+        for future in futures:
+            if future is not None:
+                # Too late if it already runs: its result is just dropped
+                metrics.incr("speculative.discarded")
+                future.cancel()
+
+    def invoke(self, state, config=None):
+        """Drop-in for `ToolNode`: answer the tool calls of the last AI message."""
+        messages = []
+        for call in state["messages"][-1].tool_calls:
+            try:
+                content, status = self.result(call), "success"
+            except Exception as e:
+                content, status = f"Error: {e!r}\n Please fix your mistakes.", "error"
+            if not isinstance(content, str):
+                content = json.dumps(content, default=str)
+            messages.append(
+                ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status=status)
+            )
+        return {"messages": messages}
+
+    __call__ = invoke
@@ -0,0 +1,245 @@
+"""Deadlines, retries and a circuit breaker for tools.
+
+A tool that talks to the network (like `fetch_weather`) can hang for as long as the OS TCP timeout.
+
+`guard_tool` wraps a plain function so that:
+
+- every attempt gets a deadline (`timeout`, in seconds), in a worker pool of its own tool
+- when that pool is full (`max_concurrency` attempts still running), calls are rejected right away
+- failed attempts are retried up to `retries` times with jittered exponential backoff
+- once the recent error rate crosses `failure_threshold`, the circuit opens and calls fail fast for `cooldown` seconds
+
+The wrapper keeps the name, signature and docstring of the function, so it can still be passed to `bind_tools`, `ToolNode` or `@tool`."""
+
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from common import metrics
+from common.trace import get_trace
+
+
+class ToolTimeoutError(TimeoutError):
+    """Raised when a single tool attempt runs past its deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a tool is called while its circuit is open."""
+
+
+class ToolBusyError(RuntimeError):
+    """Raised when every worker of a tool is still busy (with attempts that may have timed out)."""
+
+
+class CircuitBreaker:
+    """Tracks the outcome of the last `window` calls of one tool.
+
+    closed    -> calls go through
+    open      -> calls fail fast until `cooldown` seconds have passed
+    half_open -> a single trial call is let through; success closes the circuit, failure opens it again
+    """
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._outcomes.append(ok)
+            if self.state == "half_open":
+                self._trial_running = False
+                if ok:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            failures = self._outcomes.count(False)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_threshold
+            ):
+                self._open()
+
+    def release(self) -> None:
+        """Give back a trial call that never ran, without recording an outcome."""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_running = False
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_latency = {}
+_registry_lock = threading.Lock()
+
+
+def guard_tool(
+    func=None,
+    *,
+    timeout: float = 10.0,
+    retries: int = 2,
+    backoff: float = 0.2,
+    max_backoff: float = 5.0,
+    retry_on: tuple = (Exception,),
+    failure_threshold: float = 0.5,
+    window: int = 20,
+    min_calls: int = 5,
+    cooldown: float = 30.0,
+    fallback=None,
+    max_concurrency: int = 8,
+):
+    """Wrap a tool function with a deadline, retries and a circuit breaker.
+
+    Can be used as `@guard_tool` or `@guard_tool(timeout=5, retries=3)`.
+
+    Args:
+        timeout: deadline in seconds for a single attempt
+        retries: extra attempts after the first one fails
+        backoff: base delay before the first retry, doubled on every retry and fully jittered
+        max_backoff: upper bound for a single delay
+        retry_on: exception types that are worth retrying
+        failure_threshold: error rate (0-1) over the last `window` calls that opens the circuit
+        window: number of recent calls the error rate is computed over
+        min_calls: the circuit never opens before this many calls were seen
+        cooldown: seconds the circuit stays open before a trial call is let through
+        fallback: called with the last exception (and the tool arguments) instead of raising
+        max_concurrency: attempts of this tool running at once, timed-out ones included
+    """
+
+    def decorate(fn):
+        name = fn.__name__
+        breaker = CircuitBreaker(failure_threshold, window, min_calls, cooldown)
+        # Attempts run in the tool's own pool so that the caller can stop waiting when the deadline passes.
+        # Python cannot kill a thread, so a timed-out attempt keeps its worker until it returns
+        # (tools should still pass their own socket timeout, e.g. `requests.get(..., timeout=...)`).
+        # A slot is taken per attempt and given back when it returns: an attempt never waits in a queue,
+        # so its deadline only counts its own run, and a slow tool can only starve itself.
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"tool-guard-{name}")
+        slots = threading.BoundedSemaphore(max_concurrency)
+        with _registry_lock:
+            _breakers[name] = breaker
+            _latency[name] = deque(maxlen=200)
+
+        def guarded(*args, **kwargs):
+            metrics.incr(f"tool.{name}.calls")
+            if not breaker.allow():
+                metrics.incr(f"tool.{name}.rejected")
+                error = CircuitOpenError(f"Circuit for tool '{name}' is open.")
+                if fallback is not None:
+                    return fallback(error, *args, **kwargs)
+                raise error
+
+            error = None
+            for attempt in range(retries + 1):
+                if attempt:
+                    metrics.incr(f"tool.{name}.retries")
+                    delay = min(max_backoff, backoff * 2 ** (attempt - 1))
+                    time.sleep(random.uniform(0, delay))
+                if not slots.acquire(blocking=False):
+                    metrics.incr(f"tool.{name}.busy")
+                    if attempt:
+                        break  # the failed attempts before count; being busy doesn't
+                    breaker.release()
+                    error = ToolBusyError(f"Tool '{name}' has {max_concurrency} calls still running.")
+                    if fallback is not None:
+                        return fallback(error, *args, **kwargs)
+                    raise error
+                start = time.perf_counter()
+                # In the caller's context, so context variables (trace, profiling) reach the tool
+                future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+                future.add_done_callback(lambda _: slots.release())
+                try:
+                    result = future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    metrics.incr(f"tool.{name}.timeouts")
+                    error = ToolTimeoutError(
+                        f"Tool '{name}' did not finish within {timeout}s."
+                    )
+                except retry_on as e:
+                    error = e
+                except Exception as e:
+                    # Not retryable (e.g. bad arguments): count it and give up right away.
+                    _latency[name].append(time.perf_counter() - start)
+                    breaker.record(False)
+                    metrics.incr(f"tool.{name}.failures")
+                    raise e
+                else:
+                    _latency[name].append(time.perf_counter() - start)
+                    breaker.record(True)
+                    return result
+                _latency[name].append(time.perf_counter() - start)
+
+            breaker.record(False)
+            metrics.incr(f"tool.{name}.failures")
+            if fallback is not None:
+                return fallback(error, *args, **kwargs)
+            raise error
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Recorded / replayed in trace mode (see common.trace)
+            return get_trace().tool(name, guarded, args, kwargs)
+
+        wrapper.breaker = breaker
+        return wrapper
+
+    if func is not None:
+        return decorate(func)
+    return decorate
+
+
+def tool_health() -> dict:
+    """Return circuit state, error rate, latency and call counters for every guarded tool."""
+    health = {}
+    with _registry_lock:
+        names = list(_breakers)
+    for name in names:
+        latencies = sorted(_latency[name])
+        counters = metrics.snapshot(f"tool.{name}.")
+        health[name] = {
+            "circuit": _breakers[name].state,
+            "error_rate": _breakers[name].error_rate(),
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+            "p95_latency": latencies[int(len(latencies) * 0.95)] if latencies else None,
+            **{k.rsplit(".", 1)[-1]: v for k, v in counters.items()},
+        }
+    return health
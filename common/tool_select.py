@@ -0,0 +1,123 @@
+"""Bind only the tools that look relevant to the current request.
+
+`llm.bind_tools(tools)` sends every tool schema with every call. With a large toolset
+the schemas make up a big part of the prompt, so `ToolSelector` scores the tools against
+the latest user message with a small local keyword index (names + docstrings, idf-weighted),
+and binds only the top-k. Bound models are cached per tool subset.
+
+The `ToolNode` should still get the full list, so any tool the model calls can run."""
+
+import math
+import re
+from collections import Counter, OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from common import metrics
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _stem(word: str) -> str:
+    # Just enough stemming for "multiplied" to match "multiply", "adds" to match "add"...
+    for suffix in ("ing", "ed", "es", "s", "e"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[: -len(suffix)]
+            break
+    if word.endswith("y"):
+        word = word[:-1] + "i"
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    return [_stem(w) for w in _WORD.findall(text.lower().replace("_", " "))]
+
+
+def _tool_name(tool) -> str:
+    return getattr(tool, "name", None) or tool.__name__
+
+
+class ToolSelector:
+    """Pick and bind the top-k tools for each request.
+
+    Args:
+        llm: chat model to bind the tools to
+        tools: the full toolset (functions or tools)
+        k: number of tools bound per call
+        always: names of tools that are bound on every call
+        cache_size: number of bound models kept (one per distinct tool subset)
+        bind_kwargs: passed on to `llm.bind_tools` (e.g. `parallel_tool_calls=False`)
+    """
+
+    def __init__(self, llm, tools, k: int = 5, always=(), cache_size: int = 64, **bind_kwargs):
+        self.llm = llm
+        self.tools = {_tool_name(t): t for t in tools}
+        self.k = k
+        self.always = set(always)
+        self.cache_size = cache_size
+        self.bind_kwargs = bind_kwargs
+        self._bound = OrderedDict()
+
+        # Name tokens count double: they are the strongest hint of what a tool does
+        self._docs = {}
+        for name, t in self.tools.items():
+            schema = convert_to_openai_tool(t)["function"]
+            self._docs[name] = Counter(tokenize(name) * 2 + tokenize(schema.get("description", "")))
+        df = Counter(token for doc in self._docs.values() for token in doc)
+        n = len(self._docs)
+        self._idf = {token: math.log(1 + n / count) for token, count in df.items()}
+
+    def scores(self, query: str) -> dict:
+        """Score every tool against `query` (higher is more relevant)."""
+        terms = Counter(tokenize(query))
+        return {
+            name: sum(self._idf[t] * min(doc[t], 2) * q for t, q in terms.items() if t in doc)
+            for name, doc in self._docs.items()
+        }
+
+    def select(self, messages) -> list[str]:
+        """Names of the tools to bind for this conversation turn."""
+        # Score against the latest user message, and keep every tool already called since then,
+        # so that a multi-step ReAct turn never loses a tool halfway through
+        query, used = "", set()
+        for m in reversed(messages):
+            if isinstance(m, HumanMessage):
+                query = m.content if isinstance(m.content, str) else str(m.content)
+                break
+            if isinstance(m, AIMessage):
+                used.update(call["name"] for call in m.tool_calls)
+
+        scores = self.scores(query)
+        ranked = [name for name, s in sorted(scores.items(), key=lambda kv: -kv[1]) if s > 0]
+        if not ranked:
+            # Nothing matched: better to send the whole toolset than to hide the right tool
+            metrics.incr("tool_select.fallback_all")
+            return list(self.tools)
+        chosen = set(ranked[: self.k]) | (self.always & self.tools.keys()) | (used & self.tools.keys())
+        return [name for name in self.tools if name in chosen]
+
+    def bound(self, names) -> object:
+        """The llm bound to the given tools, cached per subset."""
+        key = tuple(sorted(names))
+        if key in self._bound:
+            self._bound.move_to_end(key)
+            metrics.incr("tool_select.cache_hits")
+            return self._bound[key]
+        metrics.incr("tool_select.cache_misses")
+        llm = self.llm.bind_tools([self.tools[n] for n in key], **self.bind_kwargs)
+        self._bound[key] = llm
+        if len(self._bound) > self.cache_size:
+            self._bound.popitem(last=False)
+        return llm
+
+    def for_messages(self, messages):
+        """The llm to call for `messages`, bound to the selected tools only."""
+        names = self.select(messages)
+        metrics.incr("tool_select.calls")
+        metrics.incr("tool_select.tools_bound", len(names))
+        metrics.incr("tool_select.tools_skipped", len(self.tools) - len(names))
+        return self.bound(names)
+
+    def invoke(self, messages, *args, **kwargs):
+        return self.for_messages(messages).invoke(messages, *args, **kwargs)
@@ -0,0 +1,258 @@
+"""Record / replay of graph runs, for deterministic regression benchmarks.
+
+A graph run depends on live LLM output, so two runs of the same script are never the same workload.
+In record mode every LLM call and tool call is captured with its response and timing;
+in replay mode the recorded responses are served instead, so an orchestration change can be
+measured against exactly the same trace.
+
+    GRAPH_TRACE_MODE=record GRAPH_TRACE_FILE=traces/router/multiply.jsonl.gz python -m mod1.router
+    GRAPH_TRACE_MODE=replay GRAPH_TRACE_FILE=traces/router/multiply.jsonl.gz GRAPH_TRACE_SPEED=0 python -m mod1.router
+
+GRAPH_TRACE_SPEED scales the recorded latencies: 1 keeps the original timings, 0.1 compresses them 10x,
+0 serves every response immediately.
+
+Graph runs wrapped in `get_trace().timed()` are timed in process (wall and CPU, without the imports and
+setup of the script); with GRAPH_TRACE_REPORT set, the totals are written there as JSON at exit.
+
+Models from `get_llm`, `@pure` tools and `guard_tool` tools are traced; anything else can go through
+`get_trace().call(...)`. The trace file is gzipped JSON lines: a header, then one line per call.
+
+Replay matches a call on its kind, name and a hash of the request. When the orchestration changed
+the request (e.g. a trimmed history), the next unused response recorded for the same name is served
+instead and counted in `trace.replay_fuzzy`."""
+
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+from common import metrics
+
+# Set while a traced tool runs, so nested traced wrappers (`guard_tool` around `@pure`) record once
+_in_tool = contextvars.ContextVar("in_traced_tool", default=False)
+
+
+class TraceMiss(LookupError):
+    """Raised in replay mode when the trace has no response left for a call."""
+
+
+class ReplayedError(RuntimeError):
+    """Raised in replay mode where the recorded call raised (the message keeps the original type)."""
+
+
+def request_key(request) -> str:
+    return hashlib.sha1(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _identity(value):
+    return value
+
+
+class Trace:
+    """Records calls to a trace file, or replays them from it.
+
+    Args:
+        mode: "off", "record" or "replay"
+        path: trace file (gzipped if it ends with .gz)
+        speed: factor applied to recorded latencies on replay
+        report: where to write the timings of the `timed` graph runs at exit (JSON)
+    """
+
+    def __init__(self, mode: str = "off", path: str | None = None, speed: float = 1.0, report: str | None = None):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown trace mode '{mode}'.")
+        self.mode = mode
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries = []
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self.runs = {"runs": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0}
+        self.header = {}
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            atexit.register(self.save)
+        if report:
+            atexit.register(self.write_report, report)
+
+    # Timing
+
+    @contextlib.contextmanager
+    def timed(self):
+        """Time a graph run: `with get_trace().timed(): graph.invoke(...)`."""
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.runs["runs"] += 1
+                self.runs["wall_seconds"] += time.perf_counter() - start
+                self.runs["cpu_seconds"] += time.process_time() - cpu_start
+
+    def write_report(self, path: str) -> None:
+        """Write the totals of the `timed` runs (done automatically at exit with GRAPH_TRACE_REPORT)."""
+        with self._lock, open(path, "w") as f:
+            json.dump({"mode": self.mode, "trace": self.path, **self.runs}, f)
+
+    # Recording
+
+    def _record(self, entry: dict) -> None:
+        with self._lock:
+            self._entries.append(entry)
+        metrics.incr("trace.recorded")
+
+    def save(self) -> None:
+        """Write the recorded calls (done automatically at exit)."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = {
+            "format": 1,
+            "target": " ".join(sys.argv),
+            "recorded_at": time.time(),
+            "wall_seconds": time.perf_counter() - self._started,
+            "cpu_seconds": time.process_time() - self._cpu_started,
+            "calls": len(self._entries),
+            "runs": self.runs,
+        }
+        with self._lock, _open(self.path, "wt") as f:
+            for line in [header, *self._entries]:
+                f.write(json.dumps(line, separators=(",", ":"), default=str) + "\n")
+
+    # Replay
+
+    def _load(self) -> None:
+        with _open(self.path, "rt") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        self.header = lines[0] if lines and "format" in lines[0] else {}
+        self._entries = lines[1:] if self.header else lines
+        self._by_key = defaultdict(deque)  # (kind, name, key) -> entry indexes, in recorded order
+        self._by_name = defaultdict(deque)  # (kind, name) -> entry indexes, in recorded order
+        self._used = set()
+        for i, entry in enumerate(self._entries):
+            self._by_key[entry["kind"], entry["name"], entry["key"]].append(i)
+            self._by_name[entry["kind"], entry["name"]].append(i)
+
+    def _take(self, kind: str, name: str, key: str) -> dict:
+        with self._lock:
+            for queue, fuzzy in ((self._by_key[kind, name, key], False), (self._by_name[kind, name], True)):
+                while queue:
+                    i = queue.popleft()
+                    if i not in self._used:
+                        self._used.add(i)
+                        metrics.incr("trace.replay_fuzzy" if fuzzy else "trace.replayed")
+                        return self._entries[i]
+        metrics.incr("trace.misses")
+        raise TraceMiss(f"No recorded response left for {kind} '{name}' in {self.path}.")
+
+    def _wait(self, seconds: float) -> None:
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds * self.speed)
+
+    # Calls
+
+    def call(self, kind: str, name: str, request, fn, encode=_identity, decode=_identity):
+        """`fn()`, recorded or replayed. `encode`/`decode` convert the response to and from JSON."""
+        if self.mode == "off":
+            return fn()
+        key = request_key(request)
+        if self.mode == "replay":
+            entry = self._take(kind, name, key)
+            self._wait(entry["elapsed"])
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return decode(entry["response"])
+        start = time.perf_counter()
+        try:
+            response = fn()
+        except Exception as e:
+            self._record({"kind": kind, "name": name, "key": key, "elapsed": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"})
+            raise
+        self._record({"kind": kind, "name": name, "key": key, "elapsed": time.perf_counter() - start, "response": encode(response)})
+        return response
+
+    async def acall(self, kind: str, name: str, request, fn, encode=_identity, decode=_identity):
+        """Async `call`: `fn()` returns an awaitable."""
+        if self.mode == "off":
+            return await fn()
+        key = request_key(request)
+        if self.mode == "replay":
+            entry = self._take(kind, name, key)
+            if self.speed > 0 and entry["elapsed"] > 0:
+                await asyncio.sleep(entry["elapsed"] * self.speed)
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return decode(entry["response"])
+        start = time.perf_counter()
+        try:
+            response = await fn()
+        except Exception as e:
+            self._record({"kind": kind, "name": name, "key": key, "elapsed": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"})
+            raise
+        self._record({"kind": kind, "name": name, "key": key, "elapsed": time.perf_counter() - start, "response": encode(response)})
+        return response
+
+    def stream(self, kind: str, name: str, request, fn, encode=_identity, decode=_identity):
+        """Iterate `fn()`, recording or replaying every chunk with its offset from the start."""
+        if self.mode == "off":
+            yield from fn()
+            return
+        key = request_key(request)
+        if self.mode == "replay":
+            entry = self._take(kind, name, key)
+            previous = 0.0
+            for offset, chunk in entry["chunks"]:
+                self._wait(offset - previous)
+                previous = offset
+                yield decode(chunk)
+            return
+        start = time.perf_counter()
+        chunks = []
+        for chunk in fn():
+            chunks.append((time.perf_counter() - start, encode(chunk)))
+            yield chunk
+        self._record({"kind": kind, "name": name, "key": key, "elapsed": time.perf_counter() - start, "chunks": chunks})
+
+    def tool(self, name: str, fn, args, kwargs):
+        """Trace a tool call, once, however many traced wrappers the tool goes through."""
+        if self.mode == "off" or _in_tool.get():
+            return fn(*args, **kwargs)
+        token = _in_tool.set(True)
+        try:
+            return self.call("tool", name, [args, kwargs], lambda: fn(*args, **kwargs))
+        finally:
+            _in_tool.reset(token)
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode[0])
+
+
+_trace = None
+_trace_lock = threading.Lock()
+
+
+def get_trace() -> Trace:
+    """The process-wide trace, configured by GRAPH_TRACE_MODE, GRAPH_TRACE_FILE, GRAPH_TRACE_SPEED and GRAPH_TRACE_REPORT."""
+    global _trace
+    if _trace is not None:
+        return _trace
+    with _trace_lock:
+        if _trace is None:
+            _trace = Trace(
+                mode=os.environ.get("GRAPH_TRACE_MODE", "off"),
+                path=os.environ.get("GRAPH_TRACE_FILE", "traces/trace.jsonl.gz"),
+                speed=float(os.environ.get("GRAPH_TRACE_SPEED", 1)),
+                report=os.environ.get("GRAPH_TRACE_REPORT"),
+            )
+        return _trace
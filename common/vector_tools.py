@@ -0,0 +1,154 @@
+"""Vectorized arithmetic tools, and a tool node that folds many scalar calls into one vectorized call.
+
+`add` / `multiply` / `divide` take two numbers, so a request over thousands of values becomes thousands
+of tool calls, each one a ToolMessage, a thread pool task and a round of argument validation.
+
+- `add_arrays`, `multiply_arrays`, `divide_arrays` take lists (or a number, broadcast) and answer in one call
+- `BatchingToolNode` is a drop-in for `ToolNode`: when an AI message holds several calls of a scalar tool
+  registered with a vectorized counterpart, they run as one NumPy call and are split back into one ToolMessage each
+
+Results are the same as the scalar tools: arguments are validated with the tool's own schema first (a call
+that would fail validation runs through `ToolNode` and fails there), only groups whose arguments are all ints
+or all floats are batched, so ints stay exact ints (big ones fall back to Python ints), and a division by zero
+fails the calls concerned, with the same error message as `ToolNode`.
+
+Requires numpy."""
+
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.prebuilt import ToolNode
+from langgraph.prebuilt.tool_node import msg_content_output
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from common import metrics
+
+# Products of integers below this stay within int64
+_SAFE_INT = 2**31
+
+
+def _operands(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    for x in (a, b):
+        if x.dtype.kind not in "iuf" and x.dtype != object:
+            raise TypeError(f"Expected numbers, got {x.dtype}.")
+    if a.dtype.kind in "iu" and b.dtype.kind in "iu" and max(np.abs(a).max(initial=0), np.abs(b).max(initial=0)) >= _SAFE_INT:
+        # Python ints can't overflow; int64 can
+        a, b = a.astype(object), b.astype(object)
+    return a, b
+
+
+def add_arrays(a: list[float] | float, b: list[float] | float) -> list[float] | float:
+    """Add a and b element-wise, for any number of values in one call.
+
+    Args:
+        a: list of numbers (or one number, added to every b)
+        b: list of numbers (or one number, added to every a)
+    """
+    a, b = _operands(a, b)
+    return np.add(a, b).tolist()
+
+
+def multiply_arrays(a: list[float] | float, b: list[float] | float) -> list[float] | float:
+    """Multiply a and b element-wise, for any number of values in one call.
+
+    Args:
+        a: list of numbers (or one number, multiplying every b)
+        b: list of numbers (or one number, multiplying every a)
+    """
+    a, b = _operands(a, b)
+    return np.multiply(a, b).tolist()
+
+
+def divide_arrays(a: list[float] | float, b: list[float] | float) -> list[float] | float:
+    """Divide a by b element-wise, for any number of values in one call.
+
+    Args:
+        a: list of numbers (or one number, divided by every b)
+        b: list of numbers (or one number, dividing every a)
+    """
+    a, b = _operands(a, b)
+    if np.any(b == 0):
+        raise ZeroDivisionError("division by zero")
+    return np.true_divide(a, b).tolist()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class BatchingToolNode:
+    """`ToolNode` that runs the calls of one scalar tool as a single vectorized call.
+
+    Args:
+        tools: the tools, as for `ToolNode`
+        vectorized: scalar tool (one of `tools`) -> function of `(a, b)` arrays computing the same thing,
+            e.g. `{add: add_arrays}`
+        min_batch: fewest calls of one tool worth vectorizing
+    """
+
+    def __init__(self, tools, vectorized: dict | None = None, min_batch: int = 2):
+        self.tool_node = ToolNode(tools)
+        self.vectorized = {}  # tool name -> (registered tool, vectorized function)
+        for scalar, fn in (vectorized or {}).items():
+            if not any(scalar is t for t in tools):
+                raise ValueError(f"{scalar!r} is not one of the tools of this node.")
+            name = getattr(scalar, "name", None) or scalar.__name__
+            self.vectorized[name] = (self.tool_node.tools_by_name[name], fn)
+        self.min_batch = min_batch
+        self._adapters = {}
+
+    def _batch_args(self, tool, calls) -> tuple[list, list] | None:
+        """The `a` and `b` columns of the calls, validated by the tool's schema, or None if they can't be batched."""
+        schema = tool.args_schema
+        if not isinstance(schema, type) or not issubclass(schema, BaseModel) or set(schema.model_fields) != {"a", "b"}:
+            return None
+        adapter = self._adapters.get(schema)
+        if adapter is None:
+            adapter = self._adapters[schema] = TypeAdapter(list[schema])
+        try:
+            # One validation pass over the whole group
+            validated = adapter.validate_python([call["args"] for call in calls])
+        except ValidationError:
+            return None  # ToolNode reports the error, call by call
+        a, b = [args.a for args in validated], [args.b for args in validated]
+        values = a + b
+        # All ints (exact) or all floats: a mixed group would turn int results into floats
+        if not all(map(_is_number, values)) or len({type(v) for v in values}) != 1:
+            return None
+        return a, b
+
+    def invoke(self, state, config=None):
+        """Drop-in for `ToolNode`: answer the tool calls of the last AI message."""
+        calls = state["messages"][-1].tool_calls
+        groups = defaultdict(list)
+        for call in calls:
+            groups[call["name"]].append(call)
+
+        results, rest = {}, []
+        for name, group in groups.items():
+            tool, fn = self.vectorized.get(name, (None, None))
+            columns = self._batch_args(tool, group) if fn is not None and len(group) >= self.min_batch else None
+            if columns is not None:
+                try:
+                    for call, value in zip(group, fn(*columns)):
+                        results[call["id"]] = ToolMessage(
+                            content=msg_content_output(value), name=name, tool_call_id=call["id"]
+                        )
+                    metrics.incr("vector_tools.batches")
+                    metrics.incr("vector_tools.batched_calls", len(group))
+                    continue
+                except Exception:
+                    # e.g. one division by zero: let the scalar tool answer each call, errors included
+                    metrics.incr("vector_tools.fallbacks")
+            rest.extend(group)
+
+        if rest:
+            output = self.tool_node.invoke({"messages": [AIMessage(content="", tool_calls=rest)]}, config)
+            for message in output["messages"]:
+                results[message.tool_call_id] = message
+        # Keep the order of the tool calls
+        return {"messages": [results[c["id"]] for c in calls if c["id"] in results]}
+
+    __call__ = invoke
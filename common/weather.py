@@ -0,0 +1,86 @@
+"""Compact weather records and incremental parsing of OpenWeatherMap payloads.
+
+A raw `/weather` payload is ~40 fields, most of which the model never needs, and every one of them
+costs tokens when the dict is stringified into a message. `project_weather` keeps only what answers
+"what's the weather like" in a `WeatherRecord`.
+
+For the group endpoint (`/group?id=...`, up to 20 cities per request), `iter_array_items` parses the
+`"list": [...]` array item by item while the response streams in, so each city is projected and
+dropped from memory before the next one is parsed."""
+
+import codecs
+import json
+from typing import TypedDict
+
+_decoder = json.JSONDecoder()
+
+
+class WeatherRecord(TypedDict):
+    city: str
+    country: str
+    description: str
+    temp_c: float
+    feels_like_c: float
+    humidity: int
+    wind_ms: float
+
+
+def project_weather(payload: dict) -> WeatherRecord:
+    """Keep only the fields the model needs from a `/weather` (or group list item) payload."""
+    main = payload.get("main", {})
+    weather = payload.get("weather") or [{}]
+    return {
+        "city": payload.get("name", ""),
+        "country": payload.get("sys", {}).get("country", ""),
+        "description": weather[0].get("description", ""),
+        "temp_c": main.get("temp"),
+        "feels_like_c": main.get("feels_like"),
+        "humidity": main.get("humidity"),
+        "wind_ms": payload.get("wind", {}).get("speed"),
+    }
+
+
+def iter_array_items(chunks, key: str = "list"):
+    """Yield the items of the top-level array `key` from a stream of JSON text chunks, one at a time.
+
+    Only the current item is kept in memory; everything before it is dropped as soon as it is parsed.
+    """
+    buffer = ""
+    decode = codecs.getincrementaldecoder("utf-8")().decode
+    chunks = (c if isinstance(c, str) else decode(c) for c in chunks)
+    marker = f'"{key}"'
+
+    # Find the start of the array
+    while True:
+        start = buffer.find(marker)
+        if start != -1:
+            bracket = buffer.find("[", start + len(marker))
+            if bracket != -1:
+                buffer = buffer[bracket + 1 :]
+                break
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        buffer += chunk
+
+    ended = False
+    while True:
+        stripped = buffer.lstrip(" \t\r\n,")
+        if stripped.startswith("]"):
+            return
+        if stripped:
+            try:
+                item, end = _decoder.raw_decode(stripped)
+            except json.JSONDecodeError:
+                pass  # The item is not complete yet
+            else:
+                # An item ending with the buffer may go on in the next chunk (`12` then `3]`)
+                if end < len(stripped) or ended:
+                    yield item
+                    buffer = stripped[end:]
+                    continue
+        if ended:
+            return
+        chunk = next(chunks, None)
+        ended = chunk is None
+        buffer = stripped + (chunk or "")
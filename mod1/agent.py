@@ -13,18 +13,25 @@ observe - pass the tool output back to the model
 reason - let the model reason about the tool output to decide what to do next (e.g., call another tool or just respond directly)
 This general purpose architecture can be applied to many types of tools."""
 
-from langchain_openai import ChatOpenAI
-import os
 from dotenv import load_dotenv
-from langgraph.graph import MessagesState
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import START, StateGraph
-from langgraph.prebuilt import tools_condition
-from langgraph.prebuilt import ToolNode
+from langgraph.graph import START, END, StateGraph
+
+# Shared helpers live in common/, so run this from the repo root: python -m mod1.agent
+from common import metrics
+from common.budget import BudgetState, StepBudget
+from common.llm_scheduler import get_llm
+from common.profiling import GraphProfiler
+from common.pure_cache import pure
+from common.speculative import SpeculativeExecutor
+from common.tool_guard import guard_tool
+from common.tool_select import ToolSelector
+from common.trace import get_trace
 
 load_dotenv()
 
 
+@pure
 def multiply(a: int, b: int) -> int:
     """Multiply a and b.
 
@@ -36,6 +43,7 @@ def multiply(a: int, b: int) -> int:
 
 
 # This will be a tool
+@pure
 def add(a: int, b: int) -> int:
     """Adds a and b.
 
@@ -46,6 +54,7 @@ def add(a: int, b: int) -> int:
     return a + b
 
 
+@pure
 def divide(a: int, b: int) -> float:
     """Divide a and b.
 
@@ -56,34 +65,69 @@ def divide(a: int, b: int) -> float:
     return a / b
 
 
-tools = [add, multiply, divide]
-llm = ChatOpenAI(
-    model="gpt-4o", temperature=0.1, api_key=os.environ.get("OPENAI_API_KEY")
-)
+# Give every tool a deadline and a circuit breaker.
+# These are pure functions, so an error (e.g. division by zero) is not worth retrying.
+guarded = guard_tool(timeout=2.0, retries=0)
+tools = [guarded(add), guarded(multiply), guarded(divide)]
+# Shared across graphs: one rate-limit-aware scheduler and connection pool for every model
+# (stream_usage so the step budget sees token counts while streaming)
+llm = get_llm("gpt-4o", temperature=0.1, stream_usage=True)
 
-llm_with_tools = llm.bind_tools(tools, parallel_tool_calls=False)
+# Only the tools that match the request are bound on each call (bound models are cached per subset).
+# With three tools and k=3 nothing is ever left out: in this demo the selector does nothing but show the wiring.
+# A request naming all three (add, multiply, divide) would lose one below k=3, since select() only keeps
+# tools that were already called. See bench/tool_select.py for the savings on a large toolset.
+llm_with_tools = ToolSelector(llm, tools, k=3, parallel_tool_calls=False)
 
 sys_msg = SystemMessage(
     content="You are a helpful assistant tasked with performing arithmeticon a set of inputs."
 )
 
 
-def assistant(state: MessagesState):
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+# Tools start as soon as their call is complete in the LLM stream, instead of after the full response
+speculative = SpeculativeExecutor(tools)
+
+
+def assistant(state: BudgetState):
+    msgs = [sys_msg] + state["messages"]
+    # Only calls the budget will actually run start early: no memo hits, nothing past max_tool_calls
+    response = speculative.stream(llm_with_tools.for_messages(msgs), msgs, should_start=budget.should_start(state))
+    return {"messages": [response]}
+
+
+"""The tools -> assistant edge is a loop: a model that keeps calling tools would only be stopped by the recursion limit.
+
+StepBudget caps each request on LLM hops, tool calls, tokens and wall-clock time.
+Repeated identical tool calls are answered from a memo, and when the budget is spent
+the budget_exhausted node closes the turn with a final message."""
 
+budget = StepBudget(max_llm_calls=6, max_tool_calls=10, max_tokens=20_000, max_seconds=60)
 
-builder = StateGraph(MessagesState)
+# Profiles a sample of runs node by node (set GRAPH_PROFILE_RATE, e.g. 0.01); see profiles/
+profiler = GraphProfiler()
 
-builder.add_node("assistant", assistant)
-builder.add_node("tools", ToolNode(tools))
+
+def budget_exhausted(state: BudgetState):
+    # Calls started while the answer streamed (e.g. past the token budget) will never be collected
+    speculative.discard(getattr(state["messages"][-1], "tool_calls", None) or [])
+    return budget.exhausted(state)
+
+
+builder = StateGraph(BudgetState)
+
+builder.add_node("assistant", profiler.node("assistant", budget.assistant(assistant)))
+builder.add_node("tools", profiler.node("tools", budget.tools(speculative)))
+builder.add_node("budget_exhausted", budget_exhausted)
 
 builder.add_edge(START, "assistant")
 builder.add_conditional_edges(
     "assistant",
-    tools_condition,
+    budget.route,
 )
 
-builder.add_edge("tools", "assistant")
+# Back to the assistant, or to budget_exhausted when calls in the message were past the budget
+builder.add_conditional_edges("tools", budget.after_tools)
+builder.add_edge("budget_exhausted", END)
 
 react_graph = builder.compile()
 
@@ -93,7 +137,12 @@ messages = [
     )
 ]
 
-messages = react_graph.invoke({"messages": messages})
+with get_trace().timed():
+    messages = profiler.invoke(react_graph, {"messages": messages})
 
 for m in messages["messages"]:
     m.pretty_print()
+
+# How often budgets were hit, memo hits, hops per turn...
+print(metrics.snapshot("budget."))
+print(metrics.snapshot("pure_cache."))
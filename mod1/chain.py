@@ -1,19 +1,18 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
-import os
 from dotenv import load_dotenv
 from typing_extensions import TypedDict
 from typing import Annotated
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, START, END
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod1.chain
+from common.llm_scheduler import get_llm
+
 # Load environment variables
 load_dotenv()
 
 # Initialize the LLM
-llm = ChatOpenAI(
-    model="gpt-4o", temperature=0.1, api_key=os.environ.get("OPENAI_API_KEY")
-)
+llm = get_llm("gpt-4o", temperature=0.1)
 
 
 # Define a tool (example: multiply function)
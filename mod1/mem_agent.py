@@ -1,20 +1,27 @@
 """Now, we're going extend our agent by introducing memory."""
 
-from langchain_openai import ChatOpenAI
 import os
 from dotenv import load_dotenv
-from langgraph.graph import MessagesState
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import START, StateGraph
-from langgraph.prebuilt import tools_condition
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import START, END, StateGraph
+
+# Shared helpers live in common/, so run this from the repo root: python -m mod1.mem_agent
+from common import metrics
+from common.budget import BudgetState, StepBudget
+from common.indexed_saver import IndexedMemorySaver
+from common.llm_scheduler import get_llm
+from common.memory_store import VectorMemoryStore, extract_facts
+from common.pure_cache import pure
+from common.vector_tools import BatchingToolNode, add_arrays, divide_arrays, multiply_arrays
 
 load_dotenv()
 
-memory = MemorySaver()
+# A MemorySaver that also indexes each thread's checkpoints by step and timestamp
+memory = IndexedMemorySaver()
 
 
+@pure
 def multiply(a: int, b: int) -> int:
     """Multiply a and b.
 
@@ -26,6 +33,7 @@ def multiply(a: int, b: int) -> int:
 
 
 # This will be a tool
+@pure
 def add(a: int, b: int) -> int:
     """Adds a and b.
 
@@ -36,6 +44,7 @@ def add(a: int, b: int) -> int:
     return a + b
 
 
+@pure
 def divide(a: int, b: int) -> float:
     """Divide a and b.
 
@@ -46,34 +55,66 @@ def divide(a: int, b: int) -> float:
     return a / b
 
 
-tools = [add, multiply, divide]
-llm = ChatOpenAI(
-    model="gpt-4o", temperature=0.1, api_key=os.environ.get("OPENAI_API_KEY")
-)
+# The *_arrays tools answer a whole list of operations in one call (NumPy)
+tools = [add, multiply, divide, add_arrays, multiply_arrays, divide_arrays]
+llm = get_llm("gpt-4o", temperature=0.1)
 
-llm_with_tools = llm.bind_tools(tools, parallel_tool_calls=False)
+# Parallel tool calls: independent operations come back in one AI message, which the tools node batches
+llm_with_tools = llm.bind_tools(tools)
 
 sys_msg = SystemMessage(
     content="You are a helpful assistant tasked with performing arithmeticon a set of inputs."
 )
 
 
-def assistant(state: MessagesState):
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+"""Long-term memory
+The checkpointer only remembers within a thread.
+
+To remember across threads, we keep what the user tells us about themselves in a long-term store, per user_id
+(only those sentences: "I live in Berlin" is a fact, "Multiply that by 2." is not).
+
+Facts are embedded locally and indexed, so each turn we only add the few most relevant ones to the prompt, instead of replaying old conversations."""
+
+long_term = VectorMemoryStore(os.environ.get("MEMORY_STORE_PATH", "long_term_memory"))
+
+
+def assistant(state: BudgetState, config: RunnableConfig):
+    user_id = config["configurable"].get("user_id", "default")
+    last = state["messages"][-1]
+    prompt = [sys_msg]
+    if isinstance(last, HumanMessage):
+        recalled = long_term.search(last.content, k=3, namespace=user_id)
+        if recalled:
+            facts = "\n".join(f"- {m['text']}" for m in recalled)
+            prompt.append(SystemMessage(content=f"Things the user told you before:\n{facts}"))
+        for fact in extract_facts(last.content):
+            long_term.add(fact, namespace=user_id)
+    return {"messages": [llm_with_tools.invoke(prompt + state["messages"])]}
+
 
+# Each user turn gets its own budget: the counters are reset when a new HumanMessage comes in,
+# even though the checkpointer keeps them in the thread's state
+budget = StepBudget(max_llm_calls=6, max_tool_calls=10, max_tokens=20_000, max_seconds=60)
 
-builder = StateGraph(MessagesState)
+builder = StateGraph(BudgetState)
 
-builder.add_node("assistant", assistant)
-builder.add_node("tools", ToolNode(tools))
+builder.add_node("assistant", budget.assistant(assistant))
+# Several add / multiply / divide calls in one AI message run as one vectorized call
+builder.add_node(
+    "tools",
+    budget.tools(BatchingToolNode(tools, vectorized={add: add_arrays, multiply: multiply_arrays, divide: divide_arrays})),
+)
+builder.add_node("budget_exhausted", budget.exhausted)
 
 builder.add_edge(START, "assistant")
 builder.add_conditional_edges(
     "assistant",
-    tools_condition,
+    budget.route,
 )
 
-builder.add_edge("tools", "assistant")
+# Back to the assistant, or to budget_exhausted when calls in the message were past the budget
+builder.add_conditional_edges("tools", budget.after_tools)
+builder.add_edge("budget_exhausted", END)
 
 """LangGraph can use a checkpointer to automatically save the graph state after each step.
 
@@ -81,7 +122,12 @@ This built-in persistence layer gives us memory, allowing LangGraph to pick up f
 
 One of the easiest checkpointers to use is the MemorySaver, an in-memory key-value store for Graph state.
 
-All we need to do is simply compile the graph with a checkpointer, and our graph has memory!"""
+All we need to do is simply compile the graph with a checkpointer, and our graph has memory!
+
+By default (durability="async") a step doesn't wait for its checkpoint: it is written while the next step runs,
+and invoke returns once the final checkpoint is saved. If the process dies mid-run, the thread resumes from the
+last checkpoint written, at most a step behind. durability="exit" only writes when the run ends (a crash loses
+the whole run), durability="sync" makes every step wait for its write."""
 
 react_graph = builder.compile(checkpointer=memory)
 
@@ -95,15 +141,32 @@ The checkpointer write the state at every step of the graph
 These checkpoints are saved in a thread
 We can access that thread in the future using the thread_id"""
 
-config = {"configurable": {"thread_id": "1"}}
+# The demo only runs as a script, so the graph can be imported (e.g. by common.graph_server)
+if __name__ == "__main__":
+    config = {"configurable": {"thread_id": "1", "user_id": "lance"}}
+
+    messages = [HumanMessage(content="Add 3 and 4.")]
+
+    messages = react_graph.invoke({"messages": messages}, config)
+    for m in messages["messages"]:
+        m.pretty_print()
+
+    messages = [HumanMessage(content="Multiply that by 2.")]
+    messages = react_graph.invoke({"messages": messages}, config)
+    for m in messages["messages"]:
+        m.pretty_print()
+
+    """Time travel
+    To debug a conversation, we can jump to any checkpoint of the thread by step (or by timestamp) without walking the whole history.
+
+    load_channel reads a single channel of that checkpoint, and fork starts a new thread from it, so we can replay from there without touching thread 1."""
 
-messages = [HumanMessage(content="Add 3 and 4.")]
+    checkpoint = memory.get_by_step("1", 1)
+    print(memory.load_channel(checkpoint.config, "messages")[-1].content)
 
-messages = react_graph.invoke({"messages": messages}, config)
-for m in messages["messages"]:
-    m.pretty_print()
+    fork_config = memory.fork(checkpoint.config, "1-replay")
+    replayed = react_graph.invoke(None, fork_config)
+    replayed["messages"][-1].pretty_print()
 
-messages = [HumanMessage(content="Multiply that by 2.")]
-messages = react_graph.invoke({"messages": messages}, config)
-for m in messages["messages"]:
-    m.pretty_print()
+    print(metrics.snapshot("budget."))
+    print(metrics.snapshot("pure_cache."))
@@ -2,17 +2,23 @@
 
 (2) Add a conditional edge that will look at the chat model model output, and route to our tool calling node or simply end if no tool call is performed."""
 
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph import MessagesState
 from langgraph.prebuilt import ToolNode
 from langgraph.prebuilt import tools_condition
-import os
 from dotenv import load_dotenv
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod1.router
+from common import metrics
+from common.early_exit import EarlyExitRouter
+from common.llm_scheduler import get_llm
+from common.pure_cache import pure
+from common.trace import get_trace
+
 load_dotenv()
 
 
+@pure
 def multiply(a: int, b: int) -> int:
     """Multiply a and b.
 
@@ -23,8 +29,13 @@ def multiply(a: int, b: int) -> int:
     return a * b
 
 
-llm = ChatOpenAI(model="gpt-4o", api_key=os.environ.get("OPENAI_API_KEY"))
+llm = get_llm("gpt-4o")
 llm_with_tools = llm.bind_tools([multiply])
+# Requests that need no tool go to a cheaper model
+small_llm = get_llm("gpt-4o-mini")
+
+# Obvious requests skip the full model; 5% of them are checked against it in the background
+early_exit = EarlyExitRouter(tools=[multiply], audit=llm_with_tools.invoke, audit_rate=0.05)
 
 
 """We use the built-in ToolNode and simply pass a list of our tools to initialize it.
@@ -36,11 +47,19 @@ def tool_calling_llm(state: MessagesState):
     return {"messages": [llm_with_tools.invoke(state["messages"])]}
 
 
+def small_llm_node(state: MessagesState):
+    return {"messages": [small_llm.invoke(state["messages"])]}
+
+
 # build graph
 builder = StateGraph(MessagesState)
-builder.add_node("tool_calling_llm", tool_calling_llm)
+builder.add_node("direct_tool", early_exit.direct_tool)
+builder.add_node("small_llm", early_exit.observe("small_llm", small_llm_node))
+builder.add_node("tool_calling_llm", early_exit.observe("tool_calling_llm", tool_calling_llm))
 builder.add_node("tools", ToolNode([multiply]))
-builder.add_edge(START, "tool_calling_llm")
+builder.add_conditional_edges(START, early_exit.route)
+builder.add_edge("direct_tool", "tools")
+builder.add_edge("small_llm", END)
 builder.add_conditional_edges("tool_calling_llm", tools_condition)
 
 builder.add_edge("tools", END)
@@ -49,7 +68,11 @@ graph = builder.compile()
 
 from langchain_core.messages import HumanMessage
 
-messages = [HumanMessage(content="Multiply 4 and 5.")]
-messages = graph.invoke({"messages": messages})
-for m in messages["messages"]:
-    m.pretty_print()
+for text in ("Multiply 4 and 5.", "Thanks!", "What is 6 multiplied by the number of days in a week?"):
+    with get_trace().timed():
+        messages = graph.invoke({"messages": [HumanMessage(content=text)]})
+    for m in messages["messages"]:
+        m.pretty_print()
+
+print(metrics.snapshot("pure_cache."))
+print(metrics.snapshot("router."))
@@ -49,14 +49,19 @@ Conditional Edges are used want to optionally route between nodes.
 
 Conditional edges are implemented as functions that return the next node to visit based upon some logic."""
 
-import random
 from typing import Literal
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod1.simple_graph
+from common.routing import routing_rng
+
+# Set ROUTING_SEED to replay the same sequence of routing decisions (e.g. in load tests)
+rng = routing_rng()
+
 
 def decide_mood(state) -> Literal["node2", "node3"]:
     user_input = state["graph_state"]
 
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         return "node2"
     return "node3"
 
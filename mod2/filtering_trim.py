@@ -2,13 +2,17 @@
 
 from pprint import pprint
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
-import os
 from dotenv import load_dotenv
 from langchain_core.messages import RemoveMessage, trim_messages
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod2.filtering_trim
+from common import metrics
+from common.chunk_summary import HierarchicalSummarizer
+from common.context_window import ContextState, ContextWindow
+from common.llm_scheduler import BACKGROUND, get_llm
+
 load_dotenv()
 
 messages = [AIMessage(f"So you said you were researching ocean mammals?", name="Bot")]
@@ -21,7 +25,7 @@ messages.append(
 # for m in messages:
 #     m.pretty_print()
 
-llm = ChatOpenAI(model="gpt-4o", api_key=os.environ.get("OPENAI_API_KEY"))
+llm = get_llm("gpt-4o")
 # llm.invoke(messages)
 
 
@@ -117,7 +121,7 @@ def chat_model_node_3(state: MessagesState):
         state["messages"],
         max_tokens=100,
         strategy="last",
-        token_counter=ChatOpenAI(model="gpt-4o"),
+        token_counter=llm,
         allow_partial=True,
     )
     return {"messages": [llm.invoke("messages")]}
@@ -134,3 +138,40 @@ messages.append(output["messages"][-1])
 messages.append(HumanMessage(f"Tell me where Orcas live!", name="Lance"))
 
 messages_out_trim = graph.invoke({"messages": messages})
+
+
+"""Adaptive context window
+Filtering, trimming and summarizing each suit one conversation length: a fixed strategy either wastes tokens on short conversations or loses context on long ones.
+
+ContextWindow picks, on every turn, the strategy that keeps the most context while fitting a token budget: the full history, a summary plus the recent messages (if the summary fits the latency SLO), the trimmed history, or the last message.
+
+The model then sees state["context"]; the message history itself is left untouched."""
+
+context_window = ContextWindow(
+    max_tokens=100,
+    summarizer=HierarchicalSummarizer(get_llm("gpt-4o", priority=BACKGROUND), chunk_size=4),
+    latency_slo=3.0,
+    # Exact counts from the model's tokenizer (cached per message)
+    token_counter=lambda m: llm.get_num_tokens_from_messages([m]),
+)
+
+
+def chat_model_node_4(state: ContextState):
+    return {"messages": [llm.invoke(state["context"])]}
+
+
+# Build graph
+builder_4 = StateGraph(ContextState)
+builder_4.add_node("context", context_window.node)
+builder_4.add_node("chat_model", chat_model_node_4)
+builder_4.add_edge(START, "context")
+builder_4.add_edge("context", "chat_model")
+builder_4.add_edge("chat_model", END)
+graph = builder_4.compile()
+
+messages.append(messages_out_trim["messages"][-1])
+messages.append(HumanMessage(f"And which of them is the largest?", name="Lance"))
+
+output = graph.invoke({"messages": messages})
+print(f"Strategy: {output['context_strategy']}, tokens saved: {output['tokens_saved']}")
+print(metrics.snapshot("context."))
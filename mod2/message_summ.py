@@ -4,18 +4,24 @@ This allows us to retain a compressed representation of the full conversation, r
 """
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph import MessagesState
 from langgraph.checkpoint.memory import MemorySaver
-import os
 from dotenv import load_dotenv
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod2.message_summ
+from common.chunk_summary import HierarchicalSummarizer
+from common.llm_scheduler import BACKGROUND, get_llm
+from common.profiling import GraphProfiler
+from common.trace import get_trace
+
 # Load environment variables
 load_dotenv()
 
 # Initialize the LLM
-model = ChatOpenAI(model="gpt-4o", api_key=os.environ.get("OPENAI_API_KEY"))
+model = get_llm("gpt-4o")
+# Summaries can wait: they queue behind interactive turns in the shared scheduler
+summary_model = get_llm("gpt-4o", priority=BACKGROUND)
 
 
 # Define the state for the graph
@@ -38,22 +44,20 @@ def call_model(state: State):
     return {"messages": state["messages"] + [response]}
 
 
+"""Summarizing the whole history in one call gets slower every turn, and eventually no longer fits in the context window.
+
+Instead, we split the messages into chunks, summarize the chunks in parallel, and merge the partial summaries.
+
+Chunk summaries are cached, so each turn only summarizes the newest chunk (plus a few merges)."""
+
+summarizer = HierarchicalSummarizer(summary_model, chunk_size=6, fan_in=4)
+
+
 # Function to summarize the conversation
 def conv_summary(state: State):
-    summary = state.get("summary", "")
-    if summary:
-        # Extend the existing summary
-        summary_msg = (
-            f"This is the summary of the conversation to date: {summary}\n\n"
-            "Extend the summary by taking into account the new messages above:"
-        )
-    else:
-        # Create a new summary
-        summary_msg = "Create a summary of the conversation above:"
-    # Generate the summary using the LLM
-    msgs = state["messages"] + [HumanMessage(content=summary_msg)]
-    response = model.invoke(msgs)
-    return {"summary": response.content, "messages": []}
+    # The full history is still in the state: rebuild the summary from the cached chunk summaries
+    summary = summarizer.summarize(state["messages"])
+    return {"summary": summary, "messages": []}
 
 
 # Function to decide whether to continue or summarize
@@ -64,10 +68,13 @@ def should_continue(state: State):
     return END
 
 
+# Profiles a sample of runs node by node (set GRAPH_PROFILE_RATE, e.g. 0.01); see profiles/
+profiler = GraphProfiler()
+
 # Define the graph
 workflow = StateGraph(State)
-workflow.add_node("conversation", call_model)  # Node for regular conversation
-workflow.add_node("summarize_conversation", conv_summary)  # Node for summarization
+workflow.add_node("conversation", profiler.node("conversation", call_model))  # Node for regular conversation
+workflow.add_node("summarize_conversation", profiler.node("summarize_conversation", conv_summary))  # Node for summarization
 workflow.add_edge(START, "conversation")  # Start with the conversation node
 workflow.add_conditional_edges(
     "conversation", should_continue
@@ -78,27 +85,30 @@ workflow.add_edge("summarize_conversation", END)  # End after summarization
 memory = MemorySaver()
 graph = workflow.compile(checkpointer=memory)
 
-# Configuration for the conversation thread
-config = {"configurable": {"thread_id": "1"}}
-
-# Continuous conversation loop
-print("Welcome to the AI conversation! Type 'exit' to end the conversation.")
-while True:
-    # Get user input
-    user_input = input("You: ")
-    if user_input.lower() == "exit":
-        print("Goodbye!")
-        break
-
-    # Invoke the graph with the user's input
-    output = graph.invoke({"messages": [HumanMessage(content=user_input)]}, config)
-
-    # Print the AI's response
-    for message in output["messages"][-1:]:  # Only print the latest response
-        print(f"AI: {message.content}")
-
-    # Print the summary if it exists
-    if "summary" in output and output["summary"]:
-        print("\n--- Conversation Summary ---")
-        print(output["summary"])
-        print("----------------------------\n")
+# The conversation loop only runs as a script, so the graph can be imported (e.g. by common.graph_server)
+if __name__ == "__main__":
+    # Configuration for the conversation thread
+    config = {"configurable": {"thread_id": "1"}}
+
+    # Continuous conversation loop
+    print("Welcome to the AI conversation! Type 'exit' to end the conversation.")
+    while True:
+        # Get user input (recorded and replayed with the LLM calls in trace mode)
+        user_input = get_trace().call("input", "stdin", None, lambda: input("You: "))
+        if user_input.lower() == "exit":
+            print("Goodbye!")
+            break
+
+        # Invoke the graph with the user's input
+        with get_trace().timed():
+            output = profiler.invoke(graph, {"messages": [HumanMessage(content=user_input)]}, config)
+
+        # Print the AI's response
+        for message in output["messages"][-1:]:  # Only print the latest response
+            print(f"AI: {message.content}")
+
+        # Print the summary if it exists
+        if "summary" in output and output["summary"]:
+            print("\n--- Conversation Summary ---")
+            print(output["summary"])
+            print("----------------------------\n")
@@ -6,12 +6,17 @@ All nodes are expected to communicate with that schema.
 
 LangGraph offers flexibility in how you define your state schema, accommodating various Python types and validation approaches!"""
 
-import random
 from typing import Literal
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, field_validator, ValidationError
 from langgraph.graph import START, END
 
+# Shared helpers live in common/, so run this from the repo root: python -m mod2.schema
+from common.routing import routing_rng
+
+# Set ROUTING_SEED for reproducible routing
+rng = routing_rng()
+
 """Pydantic
 As mentioned, TypedDict and dataclasses provide type hints but they don't enforce types at runtime.
 
@@ -57,7 +62,7 @@ def node_3(state):
 def decide_mood(state) -> Literal["node_2", "node_3"]:
 
     # Here, let's just do a 50 / 50 split between nodes 2, 3
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
 
         # 50% of the time, we return Node 2
         return "node_2"
@@ -159,6 +159,63 @@ For example, lets define custom reducer logic to combine lists and handle cases
 #     print(f"TypeError occurred: {e}")
 
 
+"""Scaling fan-out
+Node 1 branching into nodes 2 and 3 is the small version of a map-reduce graph.
+
+With Send, a conditional edge can fan out to as many branches as there are inputs, and they all run in the same step.
+
+But every branch update is merged with the reducer one at a time: with operator.add or reduce_list, left + right copies the whole accumulated list on every merge.
+
+Merging n branches that way is O(n^2), which shows with hundreds of branches (see bench/fanout_reducers.py).
+
+ExtendList is a channel instead of a reducer: it receives the updates of all the branches of a step together and concatenates them in one copy, so the whole merge is linear (and earlier states are left untouched)."""
+
+# Shared helpers live in common/, so run this from the repo root: python -m mod2.state_reducers
+from operator import add
+from langgraph.types import Send
+from common.fanout import ExtendList, fan_out
+
+
+class FanOutState(TypedDict):
+    items: list[int]
+    results: Annotated[list[int], ExtendList]
+
+
+def split(state):
+    # One branch per item
+    return [Send("square", {"item": item}) for item in state["items"]]
+
+
+def square(state):
+    return {"results": [state["item"] ** 2]}
+
+
+builder_4 = StateGraph(FanOutState)
+builder_4.add_node("square", square)
+builder_4.add_conditional_edges(START, split, ["square"])
+builder_4.add_edge("square", END)
+graph = builder_4.compile()
+
+print(len(graph.invoke({"items": list(range(500)), "results": []})["results"]))
+
+"""When the branches don't need to be separate graph steps, a single node can run them itself.
+
+fan_out runs the branches on a thread pool and merges the results with a tree-reduce, so each item is copied O(log n) times even with a pure reducer like operator.add."""
+
+
+def square_all(state):
+    return {"results": fan_out(lambda item: [item**2], add, state["items"])}
+
+
+builder_5 = StateGraph(FanOutState)
+builder_5.add_node("square_all", square_all)
+builder_5.add_edge(START, "square_all")
+builder_5.add_edge("square_all", END)
+graph = builder_5.compile()
+
+print(len(graph.invoke({"items": list(range(500)), "results": []})["results"]))
+
+
 """Messages
 In module 1, we showed how to use a built-in reducer, add_messages, to handle messages in state.
 
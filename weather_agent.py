@@ -1,33 +1,134 @@
 from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
 from langchain.tools import tool
 import requests
+import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from common.llm_scheduler import get_llm
+from common.single_flight import SingleFlight
+from common.speculative import SpeculativeExecutor
+from common.tool_guard import guard_tool, tool_health
+from common.weather import WeatherRecord, iter_array_items, project_weather
 
 # Load environment variables
 load_dotenv()
 
+# Point this at a local fake server (see common/fake_http.py) to test without the real API
+WEATHER_BASE_URL = os.getenv("OPENWEATHERMAP_BASE_URL", "http://api.openweathermap.org")
+
 # Initialize the LLM
-llm = ChatOpenAI(model="gpt-4", api_key=os.getenv("OPENAI_API_KEY"))
+llm = get_llm("gpt-4")
+
+
+def weather_unavailable(error, city):
+    return {"error": f"Could not fetch weather data for {city}."}
+
+
+def group_unavailable(error, city_ids):
+    return {i: {"error": f"Could not fetch weather data for city id {i}."} for i in city_ids}
+
+
+# Call OpenWeatherMap
+# Each attempt gets a 5s deadline, failures are retried twice with backoff,
+# and the circuit opens when half of the recent calls failed.
+@guard_tool(timeout=5.0, retries=2, cooldown=30.0, fallback=weather_unavailable)
+def request_weather(city: str) -> dict:
+    api_key = os.getenv("OPENWEATHERMAP_API_KEY")
+    url = f"{WEATHER_BASE_URL}/data/2.5/weather?q={city}&appid={api_key}&units=metric"
+    # (connect, read) socket timeouts, so a timed-out attempt doesn't linger in the background
+    response = requests.get(url, timeout=(3.05, 5))
+    if response.status_code == 429 or response.status_code >= 500:
+        # Upstream trouble: raise so the guard retries and counts the failure
+        response.raise_for_status()
+    if response.status_code == 200:
+        # Only the fields the model needs, not the ~40 of the raw payload
+        return project_weather(response.json())
+    else:
+        return {"error": f"Could not fetch weather data for {city}."}
+
+
+# Concurrent lookups for the same city share one upstream request,
+# and the answer is reused for a minute (errors are not cached)
+weather_flight = SingleFlight(
+    ttl=60.0, name="weather", cache_if=lambda data: "error" not in data
+)
+
+
+def normalize_city(city: str) -> str:
+    # "  new   York" and "New York" are the same lookup
+    return " ".join(city.split()).casefold()
 
 
 # Define a tool to fetch weather data
 @tool
 def fetch_weather(city: str) -> dict:
     """Fetch the current weather data for a given city."""
+    return weather_flight.do(normalize_city(city), lambda: request_weather(city))
+
+
+# OpenWeatherMap's group endpoint answers up to 20 cities per request, but only by city id
+GROUP_SIZE = 20
+
+
+@guard_tool(timeout=10.0, retries=2, cooldown=30.0, fallback=group_unavailable)
+def request_weather_group(city_ids: list[str]) -> dict[str, WeatherRecord]:
     api_key = os.getenv("OPENWEATHERMAP_API_KEY")
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()  # Return raw weather data
-    else:
-        return {"error": f"Could not fetch weather data for {city}."}
+    url = f"{WEATHER_BASE_URL}/data/2.5/group?id={','.join(city_ids)}&appid={api_key}&units=metric"
+    with requests.get(url, timeout=(3.05, 10), stream=True) as response:
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code != 200:
+            return group_unavailable(None, city_ids)
+        # Project each city as soon as it is parsed instead of loading the whole body;
+        # keyed by id, since the response needn't follow the request order nor list every id
+        return {str(item.get("id")): project_weather(item) for item in iter_array_items(response.iter_content(chunk_size=16_384))}
+
+
+bulk_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather")
+
+
+@tool
+def fetch_weather_bulk(cities: list[str]) -> dict[str, dict]:
+    """Fetch the current weather for several cities at once (names or OpenWeatherMap city ids).
+
+    Returns the weather (or an error) of every requested city, keyed by the city as given."""
+    ids = list(dict.fromkeys(c.strip() for c in cities if c.strip().isdigit()))
+    names = list(dict.fromkeys(c for c in cities if not c.strip().isdigit()))
+    groups = [ids[i : i + GROUP_SIZE] for i in range(0, len(ids), GROUP_SIZE)]
+    group_results = bulk_pool.map(request_weather_group, groups)
+    # Names have no bulk endpoint: look them up concurrently, sharing in-flight and cached lookups
+    name_results = bulk_pool.map(
+        lambda city: weather_flight.do(normalize_city(city), lambda: request_weather(city)), names
+    )
+    by_id = {city_id: record for group in group_results for city_id, record in group.items()}
+    by_name = dict(zip(names, name_results))
+    return {
+        city: by_name[city]
+        if city in by_name
+        else by_id.get(city.strip(), {"error": f"No weather data returned for city id {city.strip()}."})
+        for city in cities
+    }
 
 
 # Bind tools to the LLM
-llm_with_tools = llm.bind_tools([fetch_weather])
+llm_with_tools = llm.bind_tools([fetch_weather, fetch_weather_bulk])
+
+
+# Start fetch_weather as soon as its call is complete in the LLM stream,
+# and warm it up for a city named in the question before the LLM even answers
+speculative = SpeculativeExecutor([fetch_weather, fetch_weather_bulk])
+
+CITY_IN_QUESTION = re.compile(r"\b(?:in|for|at)\s+([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*)*)")
+
+
+def guess_weather_calls(messages):
+    match = CITY_IN_QUESTION.search(str(messages[-1].content))
+    if match:
+        return [("fetch_weather", {"city": match.group(1)})]
+    return []
 
 
 # Define the state
@@ -39,20 +140,23 @@ class State:
 def agent(state: State):
     # Extract the conversation history
     messages = state["messages"]
-    # Call the LLM with the conversation history
-    response = llm_with_tools.invoke(messages)
+    # Call the LLM with the conversation history (the weather lookup may already be running)
+    response = speculative.stream(
+        llm_with_tools, messages, prefetch=guess_weather_calls(messages)
+    )
     # Check if the LLM wants to use a tool
     if hasattr(response, "tool_calls") and response.tool_calls:
         tool_name = response.tool_calls[0]["name"]
-        tool_input = response.tool_calls[0]["args"]
-        if tool_name == "fetch_weather":
-            # Call the weather tool
-            weather_data = fetch_weather(tool_input["city"])
-            # Pass the raw weather data back to the LLM to generate a response
+        if tool_name in ("fetch_weather", "fetch_weather_bulk"):
+            # Collect the weather tool's result (started while the LLM was streaming)
+            weather_data = speculative.result(response.tool_calls[0])
+            # Pass the compact weather record(s) back to the LLM to generate a response
             llm_response = llm.invoke(
                 [
                     *messages,
-                    AIMessage(content=f"Weather data: {weather_data}"),
+                    AIMessage(
+                        content=f"Weather data: {json.dumps(weather_data, separators=(',', ':'), ensure_ascii=False)}"
+                    ),
                     HumanMessage(
                         content="Generate a user-friendly response based on the weather data."
                     ),
@@ -78,3 +182,6 @@ output = graph.invoke(
     {"messages": [HumanMessage(content="What's the weather in New York?")]}
 )
 print(output["messages"][-1].content)
+
+# Circuit state, error rate, latency and retry/timeout counters of the weather tool
+print(tool_health())